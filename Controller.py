@@ -4,19 +4,41 @@ import os, discord, sys, asyncio, Stats
 
 from dotenv import load_dotenv
 from discord.ext import commands
-from game import Game, BotGame, RANDOM, MINIMAX, MINIMAX_AB
+from game import Game, BotGame, RANDOM, MINIMAX, MINIMAX_AB, GAMESTATE
+from botpool import BotPool
+from registry import GameRegistry
+from render import Renderer
 from stones import Stone, Red, Yellow, Empty
 
 load_dotenv()
 # Use DISCORD_TEST_TOKEN for testing!
 token = os.getenv("DISCORD_TOKEN")
+# Mode of the computer (e.g. MINIMAX_AB, SOLVER or MCTS)
+botMode = os.getenv("BOT_MODE", MINIMAX_AB)
+# Game state engine of the computer search (GAMESTATE or BITBOARD)
+botEngine = os.getenv("BOT_ENGINE", GAMESTATE)
+# Time budget for a computer move in seconds (searches to a fixed depth if unset)
+botTimeBudget = float(os.getenv("BOT_TIME_BUDGET")) if os.getenv("BOT_TIME_BUDGET") else None
+# Filename of the opening book for computer moves (built with book.py)
+botBook = os.getenv("OPENING_BOOK")
+# Number of worker processes for computer moves
+botWorkers = int(os.getenv("BOT_WORKERS", "2"))
+# Seconds without a move after which a game is abandoned, and the maximum number of running games
+gameTTL = float(os.getenv("GAME_TTL", "3600"))
+maxGames = int(os.getenv("MAX_GAMES", "1000"))
+# JSON lines file for the search records of finished computer games (not written if unset)
+searchLog = os.getenv("SEARCH_LOG")
 
 bot = commands.Bot(command_prefix="-")
 
 numberEmojis = [ "1️⃣","2️⃣","3️⃣","4️⃣","5️⃣","6️⃣","7️⃣" ]
 loadingEmoji = "<a:3339_loading:787418484082606091>"
 #loadingEmoji = "<a:3859_Loading:787421781182120006>"
-games = []
+botPool = BotPool(workers=botWorkers)
+# Abandoned games are evicted, and their running computer searches cancelled
+games = GameRegistry(ttl=gameTTL, capacity=maxGames, onEvict=botPool.cancel)
+# Collapses and rate-limits the message edits of all games
+renderer = Renderer()
 
 @bot.event
 async def on_ready():
@@ -44,16 +66,17 @@ async def start(ctx):
     # If there are no mentions, any user can join as the opponent
     opponent = mentions[0] if len(mentions) == 1 else None
     if opponent != None and opponent.id == bot.user.id:
-        game = BotGame(mode=MINIMAX_AB)
+        game = BotGame(mode=botMode, timeBudget=botTimeBudget, book=botBook, engine=botEngine)
     else:
         game = Game()
 
     game.yellowPlayer = author
     game.redPlayer = opponent
     game.channel = channel
-    games.append(game)
 
+    # The game is registered by its message, which is created by drawGame
     await drawGame(game)
+    games.add(game)
 
 """
     This function will be called everytime a user reacts
@@ -76,6 +99,7 @@ async def on_reaction_add(reaction, user):
     if game != None and num != -1:
         # Check if its the users turn, and if yes, place the stone
         if game.isUserTurn(user):
+            games.touch(game)
             game.place(num)
             await afterMove(game)
 
@@ -102,19 +126,22 @@ async def afterMove(game):
         # Its the computers turn to place
         if isinstance(game, BotGame) and game.isRedTurn():
             await drawGame(game, botTurn=True)
-            game.botPlace()
-            await afterMove(game)
+            # The search runs in a worker process, returns false if the game has been abandoned
+            if await botPool.botPlace(game):
+                await afterMove(game)
         else:
             await drawGame(game)
 
 """
     This function is called after a win/draw of any player.
-    It removes the game from the games list, and stores the information for later stat retrieval.
+    It removes the game from the game registry, and stores the information for later stat retrieval.
 """
 def finishedGame(game):
-    if game in games:
-        del games[games.index(game)]
-        # TODO: Add stats here
+    botPool.cancel(game)
+    games.remove(game)
+    if isinstance(game, BotGame) and searchLog != None:
+        game.exportRecords(searchLog)
+    # TODO: Add stats here
 
 """
     Draws a winscreen, and removes all reactions.
@@ -123,8 +150,7 @@ async def drawWinScreen(game):
     msg = "Player " + game.getWinner().mention + " has won! :tada: (" + game.getLoser().mention + " has lost ... )\n\n"
     msg += gameString(game)
 
-    await game.message.edit(content=msg)
-    await game.message.clear_reactions()
+    renderer.edit(game, msg, clearReactions=True)
 
 """
     Draws a remis screen, and removes all reactions.
@@ -133,13 +159,13 @@ async def drawRemisScreen(game):
     msg = "Draw between " + game.redPlayer.mention + " and " + game.yellowPlayer.mention + " :expressionless: !\n\n"
     msg += gameString(game)
 
-    await game.message.edit(content=msg)
-    await game.message.clear_reactions()
+    renderer.edit(game, msg, clearReactions=True)
 
 """
     Draws the game. It will try to edit game.message,
     and if that doesn't exist, it will create a new message
-    and assign it. 
+    and assign it. Edits are queued in the renderer, and the
+    reactions of a new message are added in the background.
 """
 async def drawGame(game, botTurn=False):
     if botTurn:
@@ -156,38 +182,23 @@ async def drawGame(game, botTurn=False):
     if game.message == None:
         message = await game.channel.send(msg)
         game.message = message
-        for emoji in numberEmojis:
-            await message.add_reaction(emoji)
+        renderer.addReactions(message, numberEmojis)
     else:
-        await game.message.edit(content=msg)
+        renderer.edit(game, msg)
 
 """
     Returns a string representation of the game's board.
+    Only the rows changed since the last call are rendered again.
 """
 def gameString(game):
-    string = ""
-    for y in range(game.height()):
-        line = ""
-        for x in range(game.width()):
-            if game.state.board[x][y] == Red:
-                line += ":red_circle:"
-            elif game.state.board[x][y] == Yellow:
-                line += ":yellow_circle:"
-            else:
-                line += ":white_circle:"
-            line += " " * 7
-        string += line + "\n"
-    return string
-
-"""
-    Looks up the given message in the games list. Return the 
+    return renderer.boardString(game)
+
+"""
+    Looks up the given message in the game registry. Return the 
     respective game or None if not found.
 """
 def getGame(message):
-    for game in games:
-        if message.id == game.message.id:
-            return game
-    return None
+    return games.get(message.id)
 
 """
     Converts the reaction emoji into a number that can be used
@@ -1,43 +1,223 @@
-import os, json
-
-def _get_dict(filename="stats.json"):
-    try:
-        with open(filename, "r") as file:
-            return json.load(file)
-    except Exception as e:
-        return dict()
-
-def _save_dict(stats, filename="stats.json"):
-    try:
-        with open(filename, "w") as file:
-            json.dump(stats, file, indent=4)
-    except:
-        if not os.path.isfile(filename):
-            with open(filename, "w+") as file:
-                json.dump(stats, file, indent=4)
-
-def _format_stats(user, stats):
+import os, json, sqlite3, sys
+
+"""
+    Storage backends for match statistics.
+    Both backends store match dictionaries (see Game.toDict), with the moves of a match as a
+    compact game record (see record.py; older matches store the final board instead), and keep aggregate counters for every
+    user (wins, losses, draws, turns, games), which are updated whenever a match is added.
+    Stats are rendered from these counters, the matches of a user are only loaded on request.
+    The JSON backend keeps the parsed file in memory, and only reads it again if it was modified
+    by another process (files without counters are counted in memory when they are read,
+    and only saved with the counters when a match is added).
+    The backend is selected with the STATS_BACKEND environment variable ("json" or "sqlite"),
+    and the file with STATS_FILE.
+"""
+
+# Returns the counters of a new user
+def _new_totals():
+    return { "wins" : 0, "losses" : 0, "draws" : 0, "turns" : 0, "games" : 0 }
+
+# Adds the match to the counters of the given player ("#id")
+def _add_to_totals(totals, match, player_id):
+    if match["winner"] == player_id:
+        totals["wins"] += 1
+    elif match["winner"] != "":
+        totals["losses"] += 1
+    else:
+        totals["draws"] += 1
+    totals["turns"] += match["turns"]
+    totals["games"] += 1
+
+class JsonStorage:
+    def __init__(self, filename="stats.json"):
+        self.filename = filename
+
+        # Parsed stats file, reused as long as the file is not modified by another process
+        self._stats = None
+        self._version = None
+
+    # Returns (mtime, size) of the stats file, or None if there is no file
+    def _file_version(self):
+        try:
+            info = os.stat(self.filename)
+            return (info.st_mtime_ns, info.st_size)
+        except OSError:
+            return None
+
+    def _get_dict(self):
+        version = self._file_version()
+        if self._stats != None and version == self._version:
+            return self._stats
+        try:
+            with open(self.filename, "r") as file:
+                stats = json.load(file)
+        except Exception as e:
+            stats = dict()
+        self._stats = stats
+        self._version = version
+
+        # Files written without counters are counted in memory, reading never writes the file
+        for user_id, user_stats in stats.items():
+            if "totals" not in user_stats:
+                user_stats["totals"] = self._count_totals(user_id, user_stats["matches"])
+        return stats
+
+    def _save_dict(self, stats):
+        with open(self.filename, "w") as file:
+            json.dump(stats, file, indent=4, default=str)
+        self._stats = stats
+        self._version = self._file_version()
+
+    def add_match(self, match):
+        stats = self._get_dict()
+        for player_id in (match["redPlayer"], match["yellowPlayer"]):
+            user_id = player_id.lstrip("#")
+            if user_id not in stats:
+                stats[user_id] = { "matches" : [], "totals" : _new_totals() }
+            user_stats = stats[user_id]
+            user_stats["matches"].append(match)
+            _add_to_totals(user_stats["totals"], match, player_id)
+        self._save_dict(stats)
+
+    # Counts the totals of a user from the matches (for files written without counters)
+    def _count_totals(self, user_id, matches):
+        totals = _new_totals()
+        for match in matches:
+            _add_to_totals(totals, match, f"#{user_id}")
+        return totals
+
+    # Returns the counters of the user, or None if the user is unknown
+    def get_totals(self, user_id):
+        stats = self._get_dict()
+        if str(user_id) not in stats:
+            return None
+        return dict(stats[str(user_id)]["totals"])
+
+    # Returns the matches of the user, or None if the user is unknown
+    def get_matches(self, user_id):
+        stats = self._get_dict()
+        if str(user_id) not in stats:
+            return None
+        return list(stats[str(user_id)]["matches"])
+
+class SqliteStorage:
+    def __init__(self, filename="stats.db"):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    id            INTEGER PRIMARY KEY,
+                    red_player    TEXT NOT NULL,
+                    yellow_player TEXT NOT NULL,
+                    winner        TEXT NOT NULL,
+                    turns         INTEGER NOT NULL,
+                    data          TEXT NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS matches_red ON matches (red_player)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS matches_yellow ON matches (yellow_player)")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    player TEXT PRIMARY KEY,
+                    wins   INTEGER NOT NULL DEFAULT 0,
+                    losses INTEGER NOT NULL DEFAULT 0,
+                    draws  INTEGER NOT NULL DEFAULT 0,
+                    turns  INTEGER NOT NULL DEFAULT 0,
+                    games  INTEGER NOT NULL DEFAULT 0
+                )""")
+
+            # Databases written without counters
+            if self.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM users) AND EXISTS (SELECT 1 FROM matches)").fetchone()[0]:
+                self._count_totals()
+
+    # Counts the totals of all users from the matches table
+    def _count_totals(self):
+        self.connection.execute("""
+            INSERT INTO users (player, wins, losses, draws, turns, games)
+            SELECT player,
+                   SUM(winner = player), SUM(winner != player AND winner != ''), SUM(winner = ''),
+                   SUM(turns), COUNT(*)
+            FROM (SELECT red_player AS player, winner, turns FROM matches
+                  UNION ALL
+                  SELECT yellow_player AS player, winner, turns FROM matches)
+            GROUP BY player""")
+
+    def add_match(self, match):
+        self.add_matches([ match ])
+
+    # Adds all matches in a single transaction
+    def add_matches(self, matches):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO matches (red_player, yellow_player, winner, turns, data) VALUES (?, ?, ?, ?, ?)",
+                [ (match["redPlayer"], match["yellowPlayer"], match["winner"], match["turns"], json.dumps(match, default=str))
+                  for match in matches ])
+
+            # Update the counters of both players
+            self.connection.executemany("""
+                INSERT INTO users (player, wins, losses, draws, turns, games) VALUES (?, ?, ?, ?, ?, 1)
+                ON CONFLICT (player) DO UPDATE SET
+                    wins   = wins   + excluded.wins,
+                    losses = losses + excluded.losses,
+                    draws  = draws  + excluded.draws,
+                    turns  = turns  + excluded.turns,
+                    games  = games  + 1""",
+                [ (player_id, int(match["winner"] == player_id), int(match["winner"] not in (player_id, "")),
+                   int(match["winner"] == ""), match["turns"])
+                  for match in matches for player_id in (match["redPlayer"], match["yellowPlayer"]) ])
+
+    # Returns the counters of the user, or None if the user is unknown
+    def get_totals(self, user_id):
+        row = self.connection.execute("SELECT wins, losses, draws, turns, games FROM users WHERE player = ?",
+                                      (f"#{user_id}",)).fetchone()
+        if row == None:
+            return None
+        return dict(zip(("wins", "losses", "draws", "turns", "games"), row))
+
+    # Returns the matches of the user, or None if the user is unknown
+    def get_matches(self, user_id):
+        player_id = f"#{user_id}"
+        rows = self.connection.execute("""
+            SELECT id, data FROM matches WHERE red_player = ?
+            UNION ALL
+            SELECT id, data FROM matches WHERE yellow_player = ?
+            ORDER BY id""", (player_id, player_id)).fetchall()
+        if len(rows) == 0:
+            return None
+        return [ json.loads(data) for (_, data) in rows ]
+
+    def close(self):
+        self.connection.close()
+
+_storage = None
+
+# Returns the configured storage backend
+def get_storage():
+    global _storage
+    if _storage == None:
+        if os.getenv("STATS_BACKEND", "json") == "sqlite":
+            _storage = SqliteStorage(os.getenv("STATS_FILE", "stats.db"))
+        else:
+            _storage = JsonStorage(os.getenv("STATS_FILE", "stats.json"))
+    return _storage
+
+def set_storage(storage):
+    global _storage
+    _storage = storage
+
+def _format_stats(user, totals):
     string =  "Stats for player: *" + user.name + "*\n"
     string += "```\n"
     string += "| Wins | Losses | Win-Ratio | Avg. Turns |\n"
     string += "+------+--------+-----------+------------+\n"
 
     # Add values
-    matches = stats["matches"]
-    id_string = f"#{user.id}"
-    wins = 0
-    losses = 0
-    turns = []
-    for match in matches:
-        if id_string == match["winner"]:
-            wins += 1
-        elif match["winner"] != "":
-            losses += 1
-
-        turns.append(match["turns"])
-
-    avg_turns = round(sum(turns) / len(turns))
-    win_rate = round((wins / len(matches)) * 100)
+    wins = totals["wins"]
+    losses = totals["losses"]
+    games = totals["games"]
+    avg_turns = round(totals["turns"] / games) if games > 0 else 0
+    win_rate = round((wins / games) * 100) if games > 0 else 0
 
     string += "| " + str(wins) + " " * (5 - len(str(wins)))
     string += "| " + str(losses) + " " * (7 - len(str(losses)))
@@ -48,33 +228,42 @@ def _format_stats(user, stats):
     return string
 
 def get_stats(user):
-    stats = _get_dict()
-    if str(user.id) not in stats:
+    totals = get_storage().get_totals(user.id)
+    if totals == None:
         return "No stats found for User '*" + user.name + "*'.\n"
     else:
-        return _format_stats(user, stats[str(user.id)])
+        return _format_stats(user, totals)
+
+# Returns the detailed match history of the user (empty if the user is unknown)
+def get_matches(user):
+    return get_storage().get_matches(user.id) or []
 
 def add_match(game):
-    if game.red_player.id == game.yellow_player.id:
+    if game.redPlayer.id == game.yellowPlayer.id:
         return
 
     # Create match statistics
-    match_stats = game.to_dict()
-
-    # Add to json file
-    stats = _get_dict()
-    if str(game.red_player.id) not in stats:
-        stats = add_user(game.red_player, stats)
-    if str(game.yellow_player.id) not in stats:
-        stats = add_user(game.yellow_player, stats)
-
-    stats[str(game.red_player.id)]["matches"].append(match_stats)
-    stats[str(game.yellow_player.id)]["matches"].append(match_stats)
+    get_storage().add_match(game.toDict())
 
-    _save_dict(stats)
+# Copies all matches of a JSON stats file into an SQLite database.
+# Every match is stored under both players in the JSON file, but only copied once.
+def migrate(json_filename="stats.json", sqlite_filename="stats.db"):
+    stats = JsonStorage(json_filename)._get_dict()
+    storage = SqliteStorage(sqlite_filename)
+    matches = [ match for user_id, user_stats in stats.items() for match in user_stats["matches"]
+                if match["redPlayer"] == f"#{user_id}" ]
+    storage.add_matches(matches)
+    storage.close()
+    return len(matches)
 
+"""
+    Migrates the JSON stats file to an SQLite database:
+        python3 Stats.py migrate [stats.json] [stats.db]
+"""
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python3 Stats.py migrate [stats.json] [stats.db]")
+        sys.exit(1)
 
-def add_user(user, stats):
-    new_user = { "matches" : [] }
-    stats[str(user.id)] = new_user
-    return stats
+    count = migrate(*sys.argv[2:4])
+    print(f"Migrated {count} matches.")
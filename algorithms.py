@@ -1,93 +1,424 @@
 from stones import Stone, Red, Yellow, Empty
 from state import GameState
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from ordering import centerFirst
+from geometry import geometry
 import random as rand
+import time
+
+class SearchTimeout(Exception):
+    pass
 
 # Returns a random actions
 def random(state: GameState):
     actions = state.getLegalActions()
     return rand.choice(actions)
 
-# Calculates an optimal action with the minimax algorithm
-def minimax(maximize: bool, state: GameState, depth: int):
-    actions = state.getLegalActions()
+# Calculates an optimal action with the minimax algorithm.
+# If a SearchStats object is given, the search is counted in it.
+def minimax(maximize: bool, state: GameState, depth: int, stats=None):
+    actions = distinctActions(state, state.getLegalActions())
+    if stats != None:
+        stats.node(state)
     
     if depth == 0 or state.isTerminal():
-        return (None, evaluate(state))
+        if stats != None:
+            stats.leaves += 1
+        return (None, leafValue(maximize, state))
 
     if maximize:
         value = -float("inf")
         chosenAction = rand.choice(actions)
         for action in actions:
             successor = state.generateSuccessor(action)
-            newValue  = minimax(False, successor, depth-1)[1]
+            newValue  = minimax(False, successor, depth-1, stats)[1]
             if newValue > value:
                 value = newValue
                 chosenAction = action
             elif newValue == value: # select randomly if both have same value
                 chosenAction = rand.choice((chosenAction, action))
-        return (chosenAction, value)
+        return (randomMirror(state, chosenAction), value)
     
     else:
         value = float("inf")
         chosenAction = rand.choice(actions)
         for action in actions:
             successor = state.generateSuccessor(action)
-            newValue  = minimax(True, successor, depth-1)[1]
+            newValue  = minimax(True, successor, depth-1, stats)[1]
             if newValue < value:
                 value = newValue
                 chosenAction = action
             elif newValue == value:
                 chosenAction = rand.choice((chosenAction, action))
-        return (chosenAction, value)
+        return (randomMirror(state, chosenAction), value)
 
 # Calculates an optimal action with the minimax algorithm.
-# Optimized with alpha-beta pruning.
-def minimaxAB(maximize: bool, state: GameState, depth: int, alpha=-float("inf"), beta=float("inf")):
+# Optimized with alpha-beta pruning, and with the threats of both players (see threatActions):
+# decided positions are not searched, losing actions are pruned, and forced moves are extended.
+# If a transposition table is given, results are stored in and reused from it.
+# Actions are searched center-first, or in the order of the given MoveOrdering.
+# Equally good actions are chosen randomly at the root only.
+def minimaxAB(maximize: bool, state: GameState, depth: int, alpha=-float("inf"), beta=float("inf"),
+              table=None, ordering=None, root=True, stats=None):
     actions = state.getLegalActions()
+    if stats != None:
+        stats.node(state)
 
     if depth == 0 or state.isTerminal():
-        return (None, evaluate(state))
+        if stats != None:
+            stats.leaves += 1
+        return (None, leafValue(maximize, state))
+
+    actions, value = threatActions(maximize, state, actions)
+    if value != None:
+        return (actions[0], value)
+    # Forced moves are searched one ply deeper
+    childDepth = depth if len(actions) == 1 else depth - 1
+
+    alphaOrig, betaOrig = alpha, beta
+    first = None
+    if table != None:
+        key, mirrored = tableKey(maximize, state)
+        entry = table.lookup(key)
+        if stats != None:
+            stats.probe(entry != None)
+        if entry != None:
+            value, alpha, beta = probe(entry, depth, alpha, beta)
+            if value != None:
+                return (tableAction(state, entry[4], mirrored), value)
+            first = tableAction(state, entry[4], mirrored)
+    actions = orderActions(state, actions, first, ordering)
+    tieMargin = _TIE_MARGIN if root else 0
 
     if maximize:
         value = -float("inf")
-        chosenAction = rand.choice(actions)
-        for action in actions:
+        chosenAction = rand.choice(actions) if root else actions[0]
+        for index, action in enumerate(actions):
             successor = state.generateSuccessor(action)
-            newValue  = minimaxAB(False, successor, depth - 1, alpha=alpha, beta=beta)[1]
+            newValue  = minimaxAB(False, successor, childDepth, alpha=alpha - tieMargin, beta=beta,
+                                  table=table, ordering=ordering, root=False, stats=stats)[1]
             if newValue > value:
                 value = newValue
                 chosenAction = action
-            elif newValue == value:
+            elif newValue == value and root:
                 chosenAction = rand.choice((chosenAction, action))
             alpha = max(alpha, value)
             if alpha >= beta:
+                if ordering != None:
+                    ordering.cutoff(state, action, depth)
+                if stats != None:
+                    stats.cutoff(index)
                 break
-        return (chosenAction, value)
+
+    else:
+        value = float("inf")
+        chosenAction = rand.choice(actions) if root else actions[0]
+        for index, action in enumerate(actions):
+            successor = state.generateSuccessor(action)
+            newValue  = minimaxAB(True, successor, childDepth, alpha=alpha, beta=beta + tieMargin,
+                                  table=table, ordering=ordering, root=False, stats=stats)[1]
+            if newValue < value:
+                value = newValue
+                chosenAction = action
+            elif newValue == value and root:
+                chosenAction = rand.choice((chosenAction, action))
+            beta = min(beta, value)
+            if alpha >= beta:
+                if ordering != None:
+                    ordering.cutoff(state, action, depth)
+                if stats != None:
+                    stats.cutoff(index)
+                break
+
+    if table != None:
+        table.store(key, depth, value, bound(value, alphaOrig, betaOrig), tableAction(state, chosenAction, mirrored))
+    return (randomMirror(state, chosenAction) if root else chosenAction, value)
+
+# Calculates an optimal action with the minimax algorithm.
+# Searches a single copy of the state with play() and undo(), instead of
+# allocating a successor state for every node.
+def minimaxInPlace(maximize: bool, state: GameState, depth: int, stats=None):
+    return _minimaxInPlace(maximize, state.copy(), depth, stats)
+
+def _minimaxInPlace(maximize: bool, state: GameState, depth: int, stats=None):
+    actions = distinctActions(state, state.getLegalActions())
+    if stats != None:
+        stats.node(state)
+
+    if depth == 0 or state.isTerminal():
+        if stats != None:
+            stats.leaves += 1
+        return (None, leafValue(maximize, state))
+
+    if maximize:
+        value = -float("inf")
+        chosenAction = rand.choice(actions)
+        for action in actions:
+            state.play(action)
+            newValue = _minimaxInPlace(False, state, depth - 1, stats)[1]
+            state.undo()
+            if newValue > value:
+                value = newValue
+                chosenAction = action
+            elif newValue == value:
+                chosenAction = rand.choice((chosenAction, action))
+        return (randomMirror(state, chosenAction), value)
 
     else:
         value = float("inf")
         chosenAction = rand.choice(actions)
         for action in actions:
-            successor = state.generateSuccessor(action)
-            newValue  = minimaxAB(True, successor, depth - 1, alpha=alpha, beta=beta)[1]
+            state.play(action)
+            newValue = _minimaxInPlace(True, state, depth - 1, stats)[1]
+            state.undo()
             if newValue < value:
                 value = newValue
                 chosenAction = action
             elif newValue == value:
                 chosenAction = rand.choice((chosenAction, action))
+        return (randomMirror(state, chosenAction), value)
+
+# Calculates an optimal action with the minimax algorithm.
+# Optimized with alpha-beta pruning and move ordering like minimaxAB, searches in place like minimaxInPlace.
+# The action [first] is searched first at the root. If a [deadline] (time.perf_counter() value)
+# is given, a SearchTimeout is raised once it has passed.
+def minimaxABInPlace(maximize: bool, state: GameState, depth: int, alpha=-float("inf"), beta=float("inf"),
+                     table=None, ordering=None, first=None, deadline=None, stats=None):
+    if table != None:
+        table.newSearch()
+    if ordering != None:
+        ordering.newSearch()
+    return _minimaxABInPlace(maximize, state.copy(), depth, alpha, beta, table, ordering, deadline, stats, True, first)
+
+def _minimaxABInPlace(maximize: bool, state: GameState, depth: int, alpha: float, beta: float,
+                      table, ordering, deadline, stats, root=False, first=None):
+    if deadline != None and time.perf_counter() > deadline:
+        raise SearchTimeout()
+
+    actions = state.getLegalActions()
+    if stats != None:
+        stats.node(state)
+
+    if depth == 0 or state.isTerminal():
+        if stats != None:
+            stats.leaves += 1
+        return (None, leafValue(maximize, state))
+
+    actions, value = threatActions(maximize, state, actions)
+    if value != None:
+        return (actions[0], value)
+    # Forced moves are searched one ply deeper
+    childDepth = depth if len(actions) == 1 else depth - 1
+
+    alphaOrig, betaOrig = alpha, beta
+    if table != None:
+        key, mirrored = tableKey(maximize, state)
+        entry = table.lookup(key)
+        if stats != None:
+            stats.probe(entry != None)
+        if entry != None:
+            value, alpha, beta = probe(entry, depth, alpha, beta)
+            if value != None:
+                return (tableAction(state, entry[4], mirrored), value)
+            if first == None:
+                first = tableAction(state, entry[4], mirrored)
+    actions = orderActions(state, actions, first, ordering)
+    tieMargin = _TIE_MARGIN if root else 0
+
+    if maximize:
+        value = -float("inf")
+        chosenAction = rand.choice(actions) if root else actions[0]
+        for index, action in enumerate(actions):
+            state.play(action)
+            newValue = _minimaxABInPlace(False, state, childDepth, alpha - tieMargin, beta, table, ordering, deadline,
+                                         stats)[1]
+            state.undo()
+            if newValue > value:
+                value = newValue
+                chosenAction = action
+            elif newValue == value and root:
+                chosenAction = rand.choice((chosenAction, action))
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                if ordering != None:
+                    ordering.cutoff(state, action, depth)
+                if stats != None:
+                    stats.cutoff(index)
+                break
+
+    else:
+        value = float("inf")
+        chosenAction = rand.choice(actions) if root else actions[0]
+        for index, action in enumerate(actions):
+            state.play(action)
+            newValue = _minimaxABInPlace(True, state, childDepth, alpha, beta + tieMargin, table, ordering, deadline,
+                                         stats)[1]
+            state.undo()
+            if newValue < value:
+                value = newValue
+                chosenAction = action
+            elif newValue == value and root:
+                chosenAction = rand.choice((chosenAction, action))
             beta = min(beta, value)
             if alpha >= beta:
+                if ordering != None:
+                    ordering.cutoff(state, action, depth)
+                if stats != None:
+                    stats.cutoff(index)
                 break
-        return (chosenAction, value)
+
+    if table != None:
+        table.store(key, depth, value, bound(value, alphaOrig, betaOrig), tableAction(state, chosenAction, mirrored))
+    return (randomMirror(state, chosenAction) if root else chosenAction, value)
+
+# Calculates an optimal action with iterative deepening: searches with minimaxABInPlace
+# to the depths 1, 2, 3, ... until the time [budget] (in seconds) is used up, and returns
+# the result of the last completed depth. Each depth searches the best action of the
+# previous depth first. The first depth is always completed.
+def iterativeDeepening(maximize: bool, state: GameState, budget: float, maxDepth=None, table=None, ordering=None,
+                       stats=None):
+    deadline = time.perf_counter() + budget
+    if table == None:
+        table = TranspositionTable()
+
+    # Searching deeper than the number of empty cells won't change the result
+    remaining = state.board.width * state.board.height - state.turns
+    maxDepth = remaining if maxDepth == None else min(maxDepth, remaining)
+
+    result = minimaxABInPlace(maximize, state, 1, table=table, ordering=ordering, stats=stats)
+    # Forced moves are not searched any deeper
+    if forcedAction(state) != None:
+        return result
+    for depth in range(2, maxDepth + 1):
+        # Stop if the game is decided within the search horizon
+        if abs(result[1]) == float("inf"):
+            break
+        try:
+            result = minimaxABInPlace(maximize, state, depth, table=table, ordering=ordering,
+                                      first=result[0], deadline=deadline, stats=stats)
+        except SearchTimeout:
+            break
+
+    return result
+
+# Returns (actions, value) for a (not terminal) state, based on the threats of both players.
+# If the state is decided by the next two moves, value is its value for the maximizing player:
+# the player to move wins with the next stone, or can't block more than one threat of the opponent.
+# Otherwise value is None, and actions are the actions worth searching: the only action which
+# blocks a threat of the opponent, or all actions which don't give the opponent a winning cell
+# directly above (unless all actions do).
+def threatActions(maximize: bool, state: GameState, actions):
+    wins = state.winningActions()
+    if wins:
+        return (wins, float("inf") if maximize else -float("inf"))
+
+    threats = state.threatActions()
+    if len(threats) > 1:
+        return (threats, -float("inf") if maximize else float("inf"))
+    elif threats:
+        return (threats, None)
+
+    unsafe = state.unsafeActions()
+    if unsafe:
+        safe = tuple(action for action in actions if action not in unsafe)
+        if safe:
+            return (safe, None)
+    return (actions, None)
+
+# Returns the action which the player to move has to play: a winning action,
+# or the only action which blocks a threat of the opponent (None if there is no such action)
+def forcedAction(state: GameState):
+    wins = state.winningActions()
+    if wins:
+        return wins[0]
+    threats = state.threatActions()
+    if len(threats) == 1:
+        return threats[0]
+    return None
+
+# Returns the value of a leaf for the maximizing player.
+# evaluate() scores the state for the player to move, which is the
+# maximizing player only on maximizing levels.
+def leafValue(maximize: bool, state: GameState):
+    value = evaluate(state)
+    return value if maximize else -value
+
+# The actions at the root are searched with a window, which is widened by this margin, so that
+# an action which is as good as the best action so far returns its exact value, and not only a bound
+# equal to alpha (beta). Only actions with exact equal values are chosen randomly.
+# (Values are multiples of 0.5, so the margin does not include any worse value.)
+_TIE_MARGIN = 1e-6
+
+# Mixed into the zobrist hash on minimizing levels, since the stored values
+# are always seen from the maximizing player
+_MINIMIZE_KEY = 0x9E3779B97F4A7C15
+
+# Returns (key, mirrored): the transposition table key of the state, which is shared with
+# its mirror image, and true if the stored actions are mirrored (see tableAction)
+def tableKey(maximize: bool, state: GameState):
+    key, mirrored = state.canonicalHash()
+    return (key if maximize else key ^ _MINIMIZE_KEY, mirrored)
+
+# Converts an action between the state and the orientation of its table entry
+def tableAction(state: GameState, action, mirrored: bool):
+    if mirrored and action != None:
+        return state.board.width - 1 - action
+    return action
+
+# Returns the actions without their mirrored duplicates, if the position is its own mirror image
+def distinctActions(state: GameState, actions):
+    if not state.isSymmetric():
+        return actions
+    width = state.board.width
+    return tuple(action for action in actions if 2 * action <= width - 1)
+
+# Returns the action or, if the position is its own mirror image, randomly one of
+# the action and its (equally good) mirror image
+def randomMirror(state: GameState, action):
+    if action != None and state.isSymmetric() and rand.random() < 0.5:
+        return state.board.width - 1 - action
+    return action
+
+# Applies a transposition table entry to the search window.
+# Returns (value, alpha, beta), where value is None if the stored result
+# is not sufficient and the position has to be searched.
+def probe(entry, depth: int, alpha: float, beta: float):
+    _, entryDepth, value, entryBound, _, _ = entry
+    if entryDepth >= depth:
+        if entryBound == EXACT:
+            return (value, alpha, beta)
+        elif entryBound == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return (value, alpha, beta)
+    return (None, alpha, beta)
+
+# Returns the bound type of a value searched with the window (alpha, beta)
+def bound(value: float, alpha: float, beta: float):
+    if value <= alpha:
+        return UPPER
+    elif value >= beta:
+        return LOWER
+    else:
+        return EXACT
+
+# Returns the actions in search order, with [first] at the front.
+# Symmetric positions only search the actions of one half of the board.
+def orderActions(state: GameState, actions, first, ordering):
+    if state.isSymmetric():
+        actions = distinctActions(state, actions)
+        if first != None and first not in actions:
+            first = state.board.width - 1 - first
+    if ordering != None:
+        return ordering.order(state, actions, first)
+    return centerFirst(state, actions, first)
 
 # Evaluates the given states, and returns a score representing
 # how good the state is for the current player
 def evaluate(state: GameState):
-    board    = state.board
-    player   = state.currentPlayer
-    opponent = Red if player == Yellow else Yellow
-    w        = board.width
-    h        = board.height
+    player = state.currentPlayer
 
     # Check for wins or draws
     if state.winner() == player:
@@ -97,71 +428,38 @@ def evaluate(state: GameState):
     elif state.isDraw():
         return 0
 
+    # GameState and BitboardState keep the score up to date on every move
+    return state.score if player == Yellow else -state.score
+
+# Evaluates the board of the given (not terminal) state from scratch,
+# and returns the score for the current player
+def evaluateBoard(state: GameState):
+    board    = state.board
+    player   = state.currentPlayer
+    opponent = Red if player == Yellow else Yellow
+    geo      = geometry(board.width, board.height)
+    cells    = board.flatten()
+
     score = 0
     # Middle bias
-    mid = int(w / 2)
-    if w % 2 == 0:
-        score += board.column(mid).count(player)
-        score -= board.column(mid).count(opponent)
-        score += 0.5 * (board.column(mid - 1) + board.column(mid + 1)).count(player)
-        score -= 0.5 * (board.column(mid - 1) + board.column(mid + 1)).count(opponent)
-    else:
-        score += (board.column(mid) + board.column(mid + 1)).count(player)
-        score -= (board.column(mid) + board.column(mid + 1)).count(opponent)
-        score += 0.5 * (board.column(mid - 1) + board.column(mid + 2)).count(player)
-        score -= 0.5 * (board.column(mid - 1) + board.column(mid + 2)).count(opponent)
-    
-    # Horizontal: Loop through all 4-blocks, add/subtract a score of 5 if a player
-    # has 3 consecutive stones in this row, with the chance to get a 4th
-    for y in range(h):
-        blocks = toBlocks(board.row(y))
-        rowScore = 0
-        for block in blocks:
-            rowScore += evaluateBlock(block, player)
-        # Allow a maximum score of 5 per row, and a minimum of -5
-        score += max(-5, min(5, rowScore))
-
-    # Vertical: Again, loop through all 4-blocks, and add scores
-    # similar to the horizontal variant.
-    for x in range(w):
-        blocks = toBlocks(board.column(x))
-        colScore = 0
-        for block in blocks:
-            colScore += evaluateBlock(block, player)
-        score += max(-5, min(5, colScore))
-
-    # Diagonal: Same procedure again.
-    # Diagonal window starting positions (LR = left-to-right, RL = right-to-left)
-    startsLR = (  (0,2),   (0,1),   (0,0),   (1,0),   (2,0),   (3,0))
-    startsRL = ((w-1,2), (w-1,1), (w-1,0), (w-2,0), (w-3,0), (w-4,0))
-
-    slopes = []
-    for start in startsLR:
-        slope = []
-        i = 0
-        while (x := start[0] + i) < w and (y := start[1] + i) < h:
-            slope.append(board[x][y])
-            i += 1
-        slopes.append(slope)
-    
-    for start in startsRL:
-        slope = []
-        i = 0
-        while (x := start[0] - i) >= 0 and (y := start[1] + i) < h:
-            slope.append(board[x][y])
-            i += 1
-        slopes.append(slope)
-
-    for slope in slopes:
-        slopeScore = 0
-        blocks = toBlocks(slope)
-        for block in blocks:
-            slopeScore += evaluateBlock(block, player)
-        score += max(-5, min(5, slopeScore))
+    for cell, stone in enumerate(cells):
+        if stone == player:
+            score += geo.centerWeights[cell]
+        elif stone == opponent:
+            score -= geo.centerWeights[cell]
+
+    # Loop through all 4-windows, add/subtract a score of 5 if a player
+    # has 3 stones in this window, with the chance to get a 4th
+    lineScores = [0] * len(geo.lines)
+    for window, line in zip(geo.windows, geo.windowLine):
+        lineScores[line] += evaluateBlock([ cells[cell] for cell in window ], player)
+
+    # Allow a maximum score of 5 per line (row, column or diagonal), and a minimum of -5
+    for lineScore in lineScores:
+        score += max(-5, min(5, lineScore))
 
     return score
-        
-        
+
 # Evaluates a block of 4.
 # Returns 5 if player almost has 4, -5 if opponent almost has 4
 def evaluateBlock(block, player):
@@ -172,13 +470,3 @@ def evaluateBlock(block, player):
         return -5
     else:
         return 0
-
-# Splits the givén array into blocks of [blockSize]
-def toBlocks(array, blockSize=4):
-    if len(array) <= blockSize:
-        return (array,)
-
-    blocks = []
-    for i in range(0, len(array) - (blockSize - 1)):
-        blocks.append(array[i:i+4])
-    return tuple(blocks)
\ No newline at end of file
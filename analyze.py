@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+import argparse, json, math, os, random, sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from algorithms import evaluate, minimaxABInPlace
+from ordering import MoveOrdering
+from record import GameRecord
+from state import GameState
+from transposition import TranspositionTable
+
+"""
+    Analyses the stored match history (see Stats.py): replays every match from its game record,
+    and scores every move against the best move of a minimaxAB search.
+
+    Matches are streamed from the stats file one by one, from an SQLite database with a cursor,
+    and from a JSON stats file with an incremental parser (every match is stored under both players,
+    and only read once). Chunks of matches are analysed in worker processes, with a bounded number
+    of chunks in flight, so the memory use does not depend on the size of the history.
+    Matches stored without a game record (before record.py) are skipped.
+
+    Every move is written as a JSON line with the value of the played and of the best move
+    (in evaluate units, from the view of the moving player, forced wins and losses are written
+    as WIN_VALUE and -WIN_VALUE) and its classification:
+        best        as good as the best move
+        inaccuracy  loses at least INACCURACY
+        mistake     loses at least MISTAKE
+        blunder     walks into a forced loss, or misses a forced win within the search depth
+"""
+
+INACCURACY = 2
+MISTAKE    = 5
+
+# Value of a forced win in the output (JSON has no infinity), larger than every evaluate score
+WIN_VALUE  = 10000
+
+_chunkSize = 16
+
+# Yields the matches of an SQLite stats database
+def sqliteMatches(filename: str):
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        for (data,) in connection.execute("SELECT data FROM matches ORDER BY id"):
+            yield json.loads(data)
+    finally:
+        connection.close()
+
+# Incremental reader of JSON values from a file
+class _JsonReader:
+    def __init__(self, file, chunkSize: int=1 << 16):
+        self.file = file
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    # Reads the next chunk of the file, returns false at the end of the file
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunkSize)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    # Returns the next non whitespace character (without consuming it)
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                raise ValueError("Unexpected end of the JSON file")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in the JSON file, found '{self.peek()}'")
+        self.position += 1
+
+    # Consumes the separator of a container, returns false at the end of the container
+    def _next(self, end: str):
+        char = self.peek()
+        self.position += 1
+        if char == end:
+            return False
+        if char != ",":
+            raise ValueError(f"Expected ',' or '{end}' in the JSON file, found '{char}'")
+        return True
+
+    # Yields the keys of the next object, the caller has to read every value
+    def members(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self._next("}"):
+                return
+
+    # Yields before every element of the next array, the caller has to read every element
+    def elements(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield
+            if not self._next("]"):
+                return
+
+    # Decodes the next value
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A value at the end of the buffer (e.g. a number) may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+# Yields the matches of a JSON stats file ({ user id : { "matches" : [...], ... } }),
+# every match only under its red player
+def jsonMatches(filename: str):
+    with open(filename, "r") as file:
+        reader = _JsonReader(file)
+        for userId in reader.members():
+            for key in reader.members():
+                if key != "matches":
+                    reader.value()
+                    continue
+                for element in reader.elements():
+                    match = reader.value()
+                    if match["redPlayer"] == f"#{userId}":
+                        yield match
+
+# Yields the matches of the stats file, an SQLite database or a JSON file
+def streamMatches(filename: str):
+    with open(filename, "rb") as file:
+        isSqlite = file.read(16) == b"SQLite format 3\x00"
+    return sqliteMatches(filename) if isSqlite else jsonMatches(filename)
+
+# Returns the classification of a move
+def classify(value: float, best: float):
+    if value >= best:
+        return "best"
+    if value == -math.inf or best == math.inf:
+        return "blunder"
+    if best - value >= MISTAKE:
+        return "mistake"
+    if best - value >= INACCURACY:
+        return "inaccuracy"
+    return "best"
+
+# Searches the state with new tables and a fixed random seed (for the choice between equally
+# good actions), so that the result only depends on the position, and not on earlier searches
+def _search(maximize: bool, state: GameState, depth: int):
+    random.seed(0)
+    return minimaxABInPlace(maximize, state, depth, table=TranspositionTable(), ordering=MoveOrdering())
+
+# Runs in a worker process: returns the analysed moves of all matches of the chunk
+# (a list of rows per match, matches without a record get an empty list)
+def analyzeChunk(matches, depth: int):
+    results = []
+    for match in matches:
+        record = GameRecord.fromMatch(match)
+        rows = []
+        if record != None:
+            state = GameState(width=record.width, height=record.height)
+            players = { "Y" : match["yellowPlayer"], "R" : match["redPlayer"] }
+
+            for ply, action in enumerate(record.moves):
+                bestAction, best = _search(True, state, depth)
+                player = players[str(state.currentPlayer)]
+                staticValue = evaluate(state)
+                state.play(action)
+                # Search the position after the move from the view of the moving player
+                value = best if action == bestAction else _search(False, state, depth - 1)[1]
+                rows.append({ "ply" : ply, "player" : player, "action" : action, "bestAction" : bestAction,
+                              "value" : value, "best" : best, "static" : staticValue, "class" : classify(value, best) })
+        results.append(rows)
+    return results
+
+# Yields the matches in chunks of [size]
+def _chunks(matches, size: int):
+    chunk = []
+    for match in matches:
+        chunk.append(match)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Returns the value for the JSON output
+def _jsonValue(value: float):
+    return max(-WIN_VALUE, min(WIN_VALUE, value))
+
+def _newTotals():
+    return { "moves" : 0, "best" : 0, "inaccuracy" : 0, "mistake" : 0, "blunder" : 0 }
+
+# Analyses all matches of the stats file, writes every move as a JSON line to [output] (if given),
+# and returns the totals of every player.
+# At most [window] chunks of matches are analysed or waiting for their results at the same time.
+def analyze(filename: str, depth: int=6, output=None, workers=None, window=None):
+    workers = workers if workers != None else os.cpu_count()
+    window = window if window != None else 2 * workers
+    totals = dict()
+    counts = { "matches" : 0, "skipped" : 0 }
+    file = open(output, "w") if output != None else None
+
+    def collect(chunk, results):
+        for match, rows in zip(chunk, results):
+            if not rows:
+                counts["skipped"] += 1
+                continue
+            counts["matches"] += 1
+            for row in rows:
+                row["match"] = counts["matches"]
+                playerTotals = totals.setdefault(row["player"], _newTotals())
+                playerTotals["moves"] += 1
+                playerTotals[row["class"]] += 1
+                if file != None:
+                    for key in ("value", "best", "static"):
+                        row[key] = _jsonValue(row[key])
+                    file.write(json.dumps(row, allow_nan=False) + "\n")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in _chunks(streamMatches(filename), _chunkSize):
+                pending.append((chunk, executor.submit(analyzeChunk, chunk, depth)))
+                if len(pending) >= window:
+                    chunk, future = pending.popleft()
+                    collect(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                collect(chunk, future.result())
+    finally:
+        if file != None:
+            file.close()
+    return (totals, counts)
+
+# Prints the accuracy (share of best moves) and the errors of the players with the most moves
+def report(totals, counts, top: int=20):
+    print(f"Analysed {counts['matches']} matches ({counts['skipped']} without a game record skipped).")
+    print(f"{'player':<24} {'moves':>6} {'accuracy':>9} {'inaccuracies':>13} {'mistakes':>9} {'blunders':>9}")
+    for player in sorted(totals, key=lambda player: totals[player]["moves"], reverse=True)[:top]:
+        entry = totals[player]
+        accuracy = entry["best"] / entry["moves"]
+        print(f"{player:<24} {entry['moves']:>6} {accuracy:>9.1%} {entry['inaccuracy']:>13} "
+              f"{entry['mistake']:>9} {entry['blunder']:>9}")
+
+"""
+    Analyses the match history, e.g.:
+        python3 analyze.py stats.json --depth 6 --output analysis.jsonl
+        python3 analyze.py stats.db --workers 8
+"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyses all moves of the stored matches.")
+    parser.add_argument("stats", help="stats file (JSON or SQLite)")
+    parser.add_argument("--depth", type=int, default=6, help="search depth for every position")
+    parser.add_argument("--output", default=None, help="JSON lines file for the analysed moves")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--top", type=int, default=20, help="number of players in the report")
+    args = parser.parse_args()
+
+    totals, counts = analyze(args.stats, args.depth, args.output, args.workers)
+    report(totals, counts, args.top)
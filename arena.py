@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import argparse, itertools, json, math, os, sys
+import random as rand
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from stones import Red, Yellow
+from state import GameState
+from game import BotGame, RANDOM, MINIMAX, MINIMAX_AB, SOLVER, MCTS_MODE, PARALLEL_AB
+from parallel import setParallelWorkers
+
+"""
+    Headless arena: plays BotGame-vs-BotGame matches between bot configurations in a pool of
+    worker processes, and streams the results to a JSON lines file as the matches finish.
+    Every pair of configurations plays the same random openings with both colors.
+    At the end, an Elo rating of every configuration is reported, with its average think time.
+
+    Configurations are given as strings:
+        MODE[:depth[:timeBudget]]   e.g. "MINIMAX_AB:4", "MINIMAX_AB:8:0.5", "SOLVER:6:1.0"
+        MCTS[:iterations]           e.g. "MCTS:2000"
+"""
+
+_modes = (RANDOM, MINIMAX, MINIMAX_AB, SOLVER, MCTS_MODE)
+
+# Returns the BotGame settings (see BotGame.settings) of a configuration string
+def parseConfig(config: str):
+    parts = config.split(":")
+    mode = parts[0].upper()
+    if mode == PARALLEL_AB:
+        raise ValueError(f"{PARALLEL_AB} uses its own process pool and can't be played in the arena")
+    if mode not in _modes or len(parts) > 3:
+        raise ValueError(f"Invalid bot configuration '{config}'")
+
+    if mode == MCTS_MODE:
+        iterations = int(parts[1]) if len(parts) > 1 else None
+        return (mode, 4, None, None, iterations, None)
+    depth = int(parts[1]) if len(parts) > 1 else 4
+    timeBudget = float(parts[2]) if len(parts) > 2 else None
+    return (mode, depth, timeBudget, None, None, None)
+
+# Runs in a worker process: plays a match from the given opening moves
+# and returns its result as a dictionary
+def playMatch(index: int, yellow: str, red: str, opening: tuple, width: int=7, height: int=6, seed=None):
+    rand.seed(seed)
+    yellowBot = BotGame(*parseConfig(yellow))
+    redBot = BotGame(*parseConfig(red))
+    state = GameState.fromMoves(opening, width=width, height=height)
+
+    while not state.isTerminal():
+        bot = yellowBot if state.currentPlayer == Yellow else redBot
+        bot.state = state
+        state.play(bot.botAction())
+
+    if state.winner() == Yellow:
+        result = "yellow"
+    elif state.winner() == Red:
+        result = "red"
+    else:
+        result = "draw"
+
+    def summary(bot):
+        return { "moves" : len(bot.records),
+                 "time"  : sum(record["elapsed"] for record in bot.records),
+                 "nodes" : sum(record["nodes"] for record in bot.records),
+                 "times" : [ round(record["elapsed"], 6) for record in bot.records ] }
+
+    return { "index" : index, "yellow" : yellow, "red" : red, "result" : result, "opening" : list(opening),
+             "moves" : list(state.moves), "yellowStats" : summary(yellowBot), "redStats" : summary(redBot) }
+
+# Runs in every worker process when it is started: the MCTS playouts share the cores with the other workers
+def _initWorker(parallelWorkers: int):
+    setParallelWorkers(parallelWorkers)
+
+# Returns [games] random openings of [plies] moves (without finished games)
+def openings(games: int, plies: int, width: int=7, height: int=6, seed=None):
+    generator = rand.Random(seed)
+    result = []
+    while len(result) < games:
+        state = GameState(width=width, height=height)
+        for i in range(plies):
+            if state.isTerminal():
+                break
+            state.play(generator.choice(state.getLegalActions()))
+        if not state.isTerminal():
+            result.append(tuple(state.moves))
+    return result
+
+# Plays [games] matches between every pair of configurations (half of them with swapped colors),
+# and writes every result to the file [output] as soon as the match is finished.
+# Returns the list of all results.
+def run(configs, games: int, output=None, workers=None, plies: int=2, seed=None):
+    for config in configs:
+        parseConfig(config)
+    starts = openings((games + 1) // 2, plies, seed=seed)
+
+    matches = []
+    for first, second in itertools.combinations(configs, 2):
+        for i in range(games):
+            opening = starts[i // 2]
+            yellow, red = (first, second) if i % 2 == 0 else (second, first)
+            matches.append((len(matches), yellow, red, opening))
+
+    results = []
+    file = open(output, "a") if output != None else None
+    try:
+        workers = workers if workers != None else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                 initargs=(max(1, os.cpu_count() // workers),)) as executor:
+            futures = [ executor.submit(playMatch, *match, seed=hash((seed, match[0])) if seed != None else None)
+                        for match in matches ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if file != None:
+                    file.write(json.dumps(result) + "\n")
+                    file.flush()
+                print(f"\r{len(results)}/{len(matches)} matches", end="", file=sys.stderr)
+        print(file=sys.stderr)
+    finally:
+        if file != None:
+            file.close()
+    return results
+
+# Returns the score (1 win, 0.5 draw, 0 loss) of both players of a result
+def _scores(result):
+    if result["result"] == "yellow":
+        return (1.0, 0.0)
+    elif result["result"] == "red":
+        return (0.0, 1.0)
+    else:
+        return (0.5, 0.5)
+
+# Returns the Elo ratings of all configurations (with a mean of 0), fitted to the results
+# with the Bradley-Terry model. Every pair is counted with an additional draw, so that
+# configurations without wins or losses get a finite rating.
+def eloRatings(results):
+    configs = sorted({ result["yellow"] for result in results } | { result["red"] for result in results })
+    if not configs:
+        return dict()
+    scores = { config : 0.0 for config in configs }
+    games = dict()
+    for result in results:
+        yellowScore, redScore = _scores(result)
+        scores[result["yellow"]] += yellowScore
+        scores[result["red"]] += redScore
+        pair = tuple(sorted((result["yellow"], result["red"])))
+        games[pair] = games.get(pair, 0) + 1
+    for first, second in list(games):
+        games[(first, second)] += 1
+        scores[first] += 0.5
+        scores[second] += 0.5
+
+    strengths = { config : 1.0 for config in configs }
+    for iteration in range(1000):
+        updated = dict()
+        for config in configs:
+            denominator = sum(count / (strengths[first] + strengths[second])
+                              for (first, second), count in games.items() if config in (first, second))
+            updated[config] = scores[config] / denominator if denominator > 0 else strengths[config]
+        mean = math.exp(sum(math.log(strength) for strength in updated.values()) / len(updated))
+        updated = { config : strength / mean for config, strength in updated.items() }
+        converged = all(abs(updated[config] - strengths[config]) < 1e-9 for config in configs)
+        strengths = updated
+        if converged:
+            break
+    return { config : 400 * math.log10(strength) for config, strength in strengths.items() }
+
+# Prints the table of all configurations, ordered by their rating
+def report(results):
+    ratings = eloRatings(results)
+    stats = { config : [0, 0, 0, 0, 0.0, 0] for config in ratings }
+    for result in results:
+        for color, scoreIndex in (("yellow", 0), ("red", 1)):
+            config = result[color]
+            score = _scores(result)[scoreIndex]
+            entry = stats[config]
+            entry[0 if score == 1 else (1 if score == 0.5 else 2)] += 1
+            entry[3] += result[color + "Stats"]["moves"]
+            entry[4] += result[color + "Stats"]["time"]
+            entry[5] += result[color + "Stats"]["nodes"]
+
+    print(f"{'configuration':<24} {'elo':>7} {'wins':>6} {'draws':>6} {'losses':>6} {'ms/move':>9} {'nodes/move':>11}")
+    for config in sorted(ratings, key=ratings.get, reverse=True):
+        wins, draws, losses, moves, elapsed, nodes = stats[config]
+        moves = max(moves, 1)
+        print(f"{config:<24} {ratings[config]:>7.0f} {wins:>6} {draws:>6} {losses:>6} "
+              f"{1000 * elapsed / moves:>9.1f} {nodes / moves:>11.0f}")
+
+"""
+    Plays matches between bot configurations, e.g.:
+        python3 arena.py MINIMAX_AB:4 MINIMAX_AB:6 MCTS:2000 --games 100 --output arena.jsonl
+    Reports the results of a previous run:
+        python3 arena.py --report arena.jsonl
+"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays matches between bot configurations.")
+    parser.add_argument("configs", nargs="*", help="bot configurations, e.g. MINIMAX_AB:4 or MCTS:1000")
+    parser.add_argument("--games", type=int, default=20, help="number of games between every pair of configurations")
+    parser.add_argument("--plies", type=int, default=2, help="number of random opening moves")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--output", default=None, help="JSON lines file for the results")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report", default=None, help="only report the results of a JSON lines file")
+    args = parser.parse_args()
+
+    if args.report != None:
+        with open(args.report) as file:
+            results = [ json.loads(line) for line in file if line.strip() ]
+    else:
+        if len(args.configs) < 2:
+            parser.error("at least two configurations are required")
+        try:
+            results = run(args.configs, args.games, args.output, args.workers, args.plies, args.seed)
+        except ValueError as e:
+            parser.error(str(e))
+    report(results)
@@ -0,0 +1,73 @@
+import numpy as np
+from stones import Empty
+from state import GameState
+from geometry import geometry
+
+"""
+    Vectorized version of algorithms.evaluate (requires numpy).
+    Boards are encoded as int8 arrays (1 = stone of the player to move, -1 = opponent, 0 = empty),
+    and all 4-windows of a whole batch of positions are scored at once with a precomputed
+    index table. The scores are identical to algorithms.evaluate.
+    Meant for scoring many positions offline (e.g. all positions of stored games): the search
+    uses the incremental score of GameState, which is much faster than evaluating leaves in batches.
+"""
+
+# Index tables, cached per board geometry
+_tables = dict()
+
+# Returns the tables (windows, membership, centerWeights) for the given geometry:
+# windows is a (W, 4) array with the cells of every 4-window, membership a (W, L) matrix
+# assigning every window to its line, and centerWeights the middle bias of every cell.
+def tables(w: int, h: int):
+    if (w, h) not in _tables:
+        geo = geometry(w, h)
+        membership = np.zeros((len(geo.windows), len(geo.lines)), dtype=np.int32)
+        membership[np.arange(len(geo.windows)), geo.windowLine] = 1
+        _tables[(w, h)] = (np.array(geo.windows, dtype=np.intp), membership, np.array(geo.centerWeights))
+    return _tables[(w, h)]
+
+# Encodes the states as a (B, width * height) int8 array,
+# from the view of the player to move of each state
+def encode(states):
+    boards = np.zeros((len(states), len(states[0].board.flatten())), dtype=np.int8)
+    for i, state in enumerate(states):
+        player = state.currentPlayer
+        boards[i] = [ 0 if stone == Empty else (1 if stone == player else -1) for stone in state.board.flatten() ]
+    return boards
+
+# Evaluates all given states (of the same geometry) at once.
+# Returns an array with the score of algorithms.evaluate for every state.
+def evaluateBatch(states):
+    w = states[0].board.width
+    h = states[0].board.height
+    windows, membership, centerWeights = tables(w, h)
+    boards = encode(states)
+
+    cells  = boards[:, windows]
+    mine   = (cells == 1).sum(axis=2)
+    theirs = (cells == -1).sum(axis=2)
+    empty  = 4 - mine - theirs
+    windowScores = 5 * ((mine == 3) & (empty == 1)) - 5 * ((theirs == 3) & (empty == 1))
+    lineScores = np.clip(windowScores @ membership, -5, 5)
+    scores = boards @ centerWeights + lineScores.sum(axis=1)
+
+    # Wins and draws
+    for i, state in enumerate(states):
+        winner = state.winner()
+        if winner == state.currentPlayer:
+            scores[i] = float("inf")
+        elif winner != None:
+            scores[i] = -float("inf")
+        elif state.isDraw():
+            scores[i] = 0
+    return scores
+
+# Returns the scores of all positions of a game, given by its moves
+# (e.g. for the analysis of stored games)
+def evaluateGame(moves, width: int=7, height=6):
+    state = GameState(width=width, height=height)
+    states = [ state ]
+    for action in moves:
+        state = state.generateSuccessor(action)
+        states.append(state)
+    return evaluateBatch(states)
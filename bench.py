@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import argparse, json, platform, sys, time
+import random as rand
+from state import GameState
+from bitboard import BitboardState
+from algorithms import minimax, minimaxAB, minimaxABInPlace, evaluate, evaluateBoard
+from ordering import MoveOrdering
+from transposition import TranspositionTable
+from searchstats import SearchStats
+try:
+    from batcheval import evaluateBatch
+except ImportError:
+    evaluateBatch = None
+
+"""
+    Benchmark suite of the engine, on a fixed set of positions:
+        perft:    number of nodes of the full game tree up to a depth (move generation speed),
+                  for GameState and BitboardState
+        search:   nodes/sec and time-to-depth of minimax, minimaxAB and minimaxABInPlace
+                  (with transposition table and move ordering, as used by the bot),
+                  and of minimaxAB on BitboardState
+        evaluate: evaluations/sec of evaluate (incremental score), evaluateBoard (from scratch)
+                  and batcheval.evaluateBatch (all successors of a position at once, if numpy is installed)
+
+    Results are written as JSON, with one entry per measurement ("suite/name/position/depth"),
+    and can be compared against a saved baseline: rates that drop by more than the threshold
+    and perft node counts that differ are reported as regressions. Both engines have to search
+    the same tree: minimaxAB results on GameState and BitboardState that differ are reported as errors.
+"""
+
+# Version of the results format, results of different versions can't be compared.
+#   2: the "middle" position is a quiet position (the old one is decided by a forced win),
+#      minimaxAB is measured on BitboardState as well
+VERSION = 2
+
+# Positions of the benchmark, given by their moves.
+# None of the positions is decided by an immediate win or a double threat,
+# so the searches aren't cut short by the threat detection.
+POSITIONS = {
+    "start"   : (),
+    "opening" : (3, 3, 2, 4),
+    "middle"  : (3, 3, 2, 4, 4, 2, 5, 1, 1, 5),
+    "late"    : (1, 4, 6, 6, 6, 0, 2, 0, 3, 6, 3, 3, 5, 3, 6, 1, 0, 3, 0, 6),
+}
+
+# Searches with their maximum depth, all depths up to it are measured (time-to-depth)
+SEARCHES = {
+    "minimax"          : (lambda state, depth, stats: minimax(True, state, depth, stats=stats), 5),
+    "minimaxAB"        : (lambda state, depth, stats: minimaxAB(True, state, depth, stats=stats), 7),
+    "minimaxABBitboard": (lambda state, depth, stats: minimaxAB(True, BitboardState.fromGameState(state), depth,
+                                                                 stats=stats), 7),
+    "minimaxABInPlace" : (lambda state, depth, stats: minimaxABInPlace(True, state, depth, table=TranspositionTable(),
+                                                                        ordering=MoveOrdering(), stats=stats), 8),
+}
+
+# Returns the number of leaf nodes of the game tree up to [depth]
+def perft(state, depth: int):
+    if depth == 0 or state.isTerminal():
+        return 1
+    nodes = 0
+    if isinstance(state, GameState):
+        for action in state.getLegalActions():
+            state.play(action)
+            nodes += perft(state, depth - 1)
+            state.undo()
+    else:
+        for action in state.getLegalActions():
+            nodes += perft(state.generateSuccessor(action), depth - 1)
+    return nodes
+
+def _result(count: int, seconds: float, **values):
+    return { "nodes" : count, "seconds" : round(seconds, 6), "rate" : round(count / seconds) if seconds > 0 else 0, **values }
+
+def benchPerft(depth: int):
+    results = dict()
+    for name, moves in POSITIONS.items():
+        for engine in (GameState, BitboardState):
+            state = GameState.fromMoves(moves)
+            if engine == BitboardState:
+                state = BitboardState.fromGameState(state)
+            start = time.perf_counter()
+            nodes = perft(state, depth)
+            results[f"perft/{engine.__name__}/{name}/{depth}"] = _result(nodes, time.perf_counter() - start)
+    return results
+
+def benchSearch(maxDepth=None):
+    results = dict()
+    for search, (function, defaultDepth) in SEARCHES.items():
+        for name, moves in POSITIONS.items():
+            for depth in range(1, (maxDepth or defaultDepth) + 1):
+                rand.seed(0)
+                state = GameState.fromMoves(moves)
+                stats = SearchStats()
+                stats.start(state)
+                action, value = function(state, depth, stats)
+                stats.stop()
+                results[f"search/{search}/{name}/{depth}"] = _result(stats.nodes, stats.elapsed, leaves=stats.leaves,
+                                                                      tableHits=stats.tableHits, value=value)
+    return results
+
+# Evaluates all positions and their successors [repeat] times
+def benchEvaluate(repeat: int):
+    states = []
+    for moves in POSITIONS.values():
+        state = GameState.fromMoves(moves)
+        states += [ state ] + [ state.generateSuccessor(action) for action in state.getLegalActions() ]
+
+    results = dict()
+    for function in (evaluate, evaluateBoard):
+        start = time.perf_counter()
+        for i in range(repeat):
+            for state in states:
+                function(state)
+        results[f"evaluate/{function.__name__}/all/0"] = _result(repeat * len(states), time.perf_counter() - start)
+
+    if evaluateBatch != None:
+        batches = []
+        for moves in POSITIONS.values():
+            state = GameState.fromMoves(moves)
+            batches.append([ state ] + [ state.generateSuccessor(action) for action in state.getLegalActions() ])
+        start = time.perf_counter()
+        for i in range(repeat):
+            for batch in batches:
+                evaluateBatch(batch)
+        results["evaluate/evaluateBatch/all/0"] = _result(repeat * len(states), time.perf_counter() - start)
+    return results
+
+def run(perftDepth=5, searchDepth=None, evaluateRepeat=200):
+    results = dict()
+    results.update(benchPerft(perftDepth))
+    results.update(benchSearch(searchDepth))
+    results.update(benchEvaluate(evaluateRepeat))
+    return { "version" : VERSION, "python" : platform.python_version(), "time" : time.time(), "results" : results }
+
+# Compares the results against a baseline. Returns a list of (key, message) of all regressions:
+# rates lower than (1 - threshold) * baseline, and perft node counts that differ from the baseline.
+# Baselines of another results version are reported as a single regression.
+def compare(baseline: dict, current: dict, threshold: float=0.1):
+    if baseline.get("version") != current.get("version"):
+        return [("version", f"results version {current.get('version')}, baseline version "
+                            f"{baseline.get('version')}: save a new baseline")]
+    regressions = []
+    for key, base in baseline["results"].items():
+        result = current["results"].get(key)
+        if result == None:
+            continue
+        if key.startswith("perft/") and result["nodes"] != base["nodes"]:
+            regressions.append((key, f"{result['nodes']} nodes, baseline {base['nodes']}"))
+        elif result["rate"] < (1 - threshold) * base["rate"]:
+            regressions.append((key, f"{result['rate']}/s, baseline {base['rate']}/s"))
+    return regressions
+
+# Returns a list of (key, message) of all minimaxAB searches, whose value or node count
+# on BitboardState differs from GameState
+def backendMismatches(current: dict):
+    mismatches = []
+    for key, result in current["results"].items():
+        if not key.startswith("search/minimaxAB/"):
+            continue
+        other = current["results"].get(key.replace("/minimaxAB/", "/minimaxABBitboard/"))
+        if other == None:
+            continue
+        if (other["value"], other["nodes"]) != (result["value"], result["nodes"]):
+            mismatches.append((key, f"BitboardState {other['value']} ({other['nodes']} nodes), "
+                                    f"GameState {result['value']} ({result['nodes']} nodes)"))
+    return mismatches
+
+# Prints a table of the results, with the change against the baseline
+def report(current: dict, baseline=None):
+    for key, result in current["results"].items():
+        line = f"{key:<42} {result['nodes']:>10} nodes {result['seconds']:>10.4f}s {result['rate']:>10}/s"
+        if baseline != None and key in baseline["results"] and baseline["results"][key]["rate"] > 0:
+            change = result["rate"] / baseline["results"][key]["rate"] - 1
+            line += f" {change:+7.1%}"
+        print(line)
+
+"""
+    Runs the benchmarks and compares them against a baseline, e.g.:
+        python3 bench.py run --output baseline.json
+        python3 bench.py run --output results.json --baseline baseline.json --threshold 0.1
+        python3 bench.py compare baseline.json results.json
+    Exits with status 1 if there are regressions, or if the engines disagree.
+"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the connect 4 engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runParser = commands.add_parser("run", help="run the benchmarks")
+    runParser.add_argument("--perft-depth", type=int, default=5)
+    runParser.add_argument("--search-depth", type=int, default=None, help="maximum depth of all searches")
+    runParser.add_argument("--evaluate-repeat", type=int, default=200)
+    runParser.add_argument("--output", default=None, help="JSON results file")
+    runParser.add_argument("--baseline", default=None, help="JSON results file to compare against")
+    runParser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown")
+
+    compareParser = commands.add_parser("compare", help="compare two results files")
+    compareParser.add_argument("baseline")
+    compareParser.add_argument("results")
+    compareParser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        current = run(args.perft_depth, args.search_depth, args.evaluate_repeat)
+        if args.output != None:
+            with open(args.output, "w") as file:
+                json.dump(current, file, indent=4)
+        baselineFile = args.baseline
+    else:
+        with open(args.results) as file:
+            current = json.load(file)
+        baselineFile = args.baseline
+
+    baseline = None
+    if baselineFile != None:
+        with open(baselineFile) as file:
+            baseline = json.load(file)
+    report(current, baseline)
+
+    mismatches = backendMismatches(current)
+    for key, message in mismatches:
+        print(f"Engine mismatch: {key}: {message}")
+    regressions = []
+    if baseline != None:
+        regressions = compare(baseline, current, args.threshold)
+        for key, message in regressions:
+            print(f"Regression: {key}: {message}")
+    if regressions or mismatches:
+        sys.exit(1)
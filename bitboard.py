@@ -0,0 +1,339 @@
+from stones import Stone, Red, Yellow, Empty
+from board import Board
+from state import IllegalActionException, _windowScores
+from geometry import geometry
+
+"""
+    Alternative game state engine, which stores the position as two integer bitboards
+    (one per player) and the height of every column.
+
+    Every column uses (height + 1) bits, starting with the bottom cell, so that the
+    extra bit on top of each column keeps the shifted masks of the win check from
+    wrapping into the next column:
+
+        bit index of the cell (x, y) = x * (height + 1) + (height - 1 - y)
+
+    where (x, y) are the coordinates used by board.Board (y = 0 is the top row).
+    The class exposes the same interface as state.GameState (including play() and undo(),
+    and the incremental score of algorithms.evaluate), so it can be searched with the functions
+    of algorithms.py. BotGame searches on it with the engine setting BITBOARD.
+"""
+class BitboardState:
+    # Unscored states (scored=False) don't update the score (e.g. for random playouts, see mcts.py)
+    def __init__(self, width: int=7, height=6, scored: bool=True):
+        self.width  = width
+        self.height = height
+        self.yellow = 0
+        self.red    = 0
+        # Bitboards of the mirrored (left-right) position, for the mirror key
+        self.mirrorYellow = 0
+        self.mirrorRed    = 0
+        self.heights = [0] * width
+        self.currentPlayer = Yellow
+        self.turns = 0
+
+        # Is set by the place() function, when the placed stone connects four
+        self._winner = None
+
+        # Stack of all played actions, used by undo(), and the number of moves
+        # after which the winner was decided
+        self.moves = []
+        self._winnerMoves = 0
+
+        # Board object, which is built on demand by the board view
+        self._board = None
+        self._view = _BoardView(self)
+
+        # Heuristic score of algorithms.evaluate from the view of Yellow, updated by play() and undo()
+        # (as in state.GameState)
+        self._geometry = geometry(width, height)
+        self._scored = scored
+        self.score = 0
+        self._yellowCounts = [0] * len(self._geometry.windows)
+        self._redCounts = [0] * len(self._geometry.windows)
+        self._lineScores = [0] * len(self._geometry.lines)
+
+    # Creates a bitboard state from a state.GameState, by playing its moves
+    @classmethod
+    def fromGameState(cls, state):
+        bitboardState = cls(width=state.board.width, height=state.board.height)
+        for action in state.moves:
+            bitboardState.play(action)
+        return bitboardState
+
+    # Returns a view of the Board object of the current position. The search only needs the size
+    # of the board, the Board object is only built if the stones are accessed (see _BoardView).
+    @property
+    def board(self):
+        return self._view
+
+    # Returns the Board object of the current position
+    def _fullBoard(self):
+        if self._board == None:
+            board = Board(self.width, self.height)
+            for x in range(self.width):
+                column = board.column(x)
+                for y in range(self.heights[x]):
+                    bit = 1 << (x * (self.height + 1) + y)
+                    column[self.height - 1 - y] = Yellow if self.yellow & bit else Red
+            self._board = board
+        return self._board
+
+    # Returns a unique key of the position: the stones of the player to move plus the mask of all stones.
+    # The key fits into 64 bits for boards with width * (height + 1) <= 64.
+    def key(self):
+        current = self.yellow if self.currentPlayer == Yellow else self.red
+        return current + (self.yellow | self.red)
+
+    # Returns the key of the mirrored (left-right) position
+    def mirrorKey(self):
+        current = self.mirrorYellow if self.currentPlayer == Yellow else self.mirrorRed
+        return current + (self.mirrorYellow | self.mirrorRed)
+
+    # Hash of the position and of its mirror image, as in state.GameState (used by the transposition table)
+    @property
+    def hash(self):
+        return self.key()
+
+    @property
+    def mirrorHash(self):
+        return self.mirrorKey()
+
+    # Returns (hash, mirrored): the smaller key of the position and its mirror image,
+    # and true if that is the key of the mirror image
+    def canonicalHash(self):
+        key = self.key()
+        mirrorKey = self.mirrorKey()
+        if mirrorKey < key:
+            return (mirrorKey, True)
+        return (key, False)
+
+    # Returns true if the position is its own mirror image
+    def isSymmetric(self):
+        # Positions with different column heights can't be symmetric
+        heights = self.heights
+        for x in range(self.width // 2):
+            if heights[x] != heights[self.width - 1 - x]:
+                return False
+        return self.yellow == self.mirrorYellow and self.red == self.mirrorRed
+
+    # Returns true if the action is legal
+    def isLegalAction(self, action: int):
+        return 0 <= action < self.width and self.heights[action] < self.height
+
+    # Returns a tuple of all legal actions
+    def getLegalActions(self):
+        return tuple(x for x in range(self.width) if self.heights[x] < self.height)
+
+    # Returns a copy of this state
+    def copy(self):
+        # Skips __init__, since all fields are copied
+        copy = BitboardState.__new__(BitboardState)
+        copy.width  = self.width
+        copy.height = self.height
+        copy.yellow = self.yellow
+        copy.red    = self.red
+        copy.mirrorYellow = self.mirrorYellow
+        copy.mirrorRed    = self.mirrorRed
+        copy.heights = self.heights.copy()
+        copy.currentPlayer = self.currentPlayer
+        copy.turns = self.turns
+        copy._winner = self._winner
+        copy.moves = self.moves.copy()
+        copy._winnerMoves = self._winnerMoves
+        copy._board = None
+        copy._view = _BoardView(copy)
+        copy._geometry = self._geometry
+        copy._scored = self._scored
+        copy.score = self.score
+        copy._yellowCounts = self._yellowCounts.copy()
+        copy._redCounts = self._redCounts.copy()
+        copy._lineScores = self._lineScores.copy()
+        return copy
+
+    # Returns the successor based on the action and current player
+    def generateSuccessor(self, action: int):
+        if not self.isLegalAction(action):
+            raise IllegalActionException()
+
+        successor = self.copy()
+        successor.place(action)
+        return successor
+
+    # Returns the number of stones on the board
+    def count(self, stone: Stone):
+        if stone == Yellow:
+            return bin(self.yellow).count("1")
+        elif stone == Red:
+            return bin(self.red).count("1")
+        else:
+            return self.width * self.height - self.turns
+
+    # Sets currentPlayer to the next player
+    def nextPlayer(self):
+        self.currentPlayer = Red if self.currentPlayer == Yellow else Yellow
+
+    # Places a stone of the current player on the board
+    def place(self, action: int):
+        if not self.isLegalAction(action):
+            raise IllegalActionException()
+
+        self.play(action)
+
+    # Places a stone of the current player on the board, without checking
+    # if the action is legal. Can be reverted with undo().
+    def play(self, action: int):
+        row = self.heights[action]
+        bit = 1 << (action * (self.height + 1) + row)
+        mirrorBit = 1 << ((self.width - 1 - action) * (self.height + 1) + row)
+        if self.currentPlayer == Yellow:
+            self.yellow |= bit
+            self.mirrorYellow |= mirrorBit
+            bitboard = self.yellow
+        else:
+            self.red |= bit
+            self.mirrorRed |= mirrorBit
+            bitboard = self.red
+        if self._scored:
+            self._updateScore(action * self.height + self.height - 1 - row, 1)
+        self.moves.append(action)
+
+        # Only the player who just placed can have connected four
+        if self._winner == None and self._connectsFour(bitboard):
+            self._winner = self.currentPlayer
+            self._winnerMoves = len(self.moves)
+
+        self.heights[action] = row + 1
+        self.turns += 1
+        self._board = None
+        self.nextPlayer()
+
+    # Reverts the last action placed with play() or place()
+    def undo(self):
+        action = self.moves.pop()
+        row = self.heights[action] - 1
+        self.heights[action] = row
+        self.turns -= 1
+        self._board = None
+        self.nextPlayer()
+
+        bit = 1 << (action * (self.height + 1) + row)
+        mirrorBit = 1 << ((self.width - 1 - action) * (self.height + 1) + row)
+        if self.currentPlayer == Yellow:
+            self.yellow &= ~bit
+            self.mirrorYellow &= ~mirrorBit
+        else:
+            self.red &= ~bit
+            self.mirrorRed &= ~mirrorBit
+        if self._winner != None and len(self.moves) < self._winnerMoves:
+            self._winner = None
+        if self._scored:
+            self._updateScore(action * self.height + self.height - 1 - row, -1)
+
+    # Adds (delta = 1) or removes (delta = -1) a stone of the current player at the given cell
+    # (index x * height + y, see geometry.py) to the window counts, and updates the score
+    # of the windows and lines through this cell (see state.GameState._updateScore)
+    def _updateScore(self, cell: int, delta: int):
+        geo = self._geometry
+        yellowCounts = self._yellowCounts
+        redCounts = self._redCounts
+        lineScores = self._lineScores
+        isYellow = self.currentPlayer == Yellow
+        score = self.score
+
+        for window in geo.cellWindows[cell]:
+            yellow = yellowCounts[window]
+            red = redCounts[window]
+            old = _windowScores[yellow * 5 + red]
+            if isYellow:
+                yellow += delta
+                yellowCounts[window] = yellow
+            else:
+                red += delta
+                redCounts[window] = red
+            new = _windowScores[yellow * 5 + red]
+
+            if new != old:
+                line = geo.windowLine[window]
+                oldLine = lineScores[line]
+                newLine = oldLine + new - old
+                lineScores[line] = newLine
+                # Every line adds a score between -5 and 5
+                score += max(-5, min(5, newLine)) - max(-5, min(5, oldLine))
+
+        center = geo.centerWeights[cell] * delta
+        self.score = score + center if isYellow else score - center
+
+    # Returns the actions with which the current player would connect four
+    def winningActions(self):
+        return self._actionsBelow(self._winningCells(self.yellow if self.currentPlayer == Yellow else self.red), 0)
+
+    # Returns the actions with which the opponent would connect four, if it was their turn.
+    # The current player has to block these actions (and loses if there is more than one).
+    def threatActions(self):
+        return self._actionsBelow(self._winningCells(self.red if self.currentPlayer == Yellow else self.yellow), 0)
+
+    # Returns the actions which would allow the opponent to connect four directly above them
+    def unsafeActions(self):
+        return self._actionsBelow(self._winningCells(self.red if self.currentPlayer == Yellow else self.yellow), 1)
+
+    # Returns the mask of all cells which would complete four stones of the bitboard
+    # (including occupied cells and the extra bit of every column)
+    def _winningCells(self, stones: int):
+        h1 = self.height + 1
+
+        # Vertically, horizontally and diagonally
+        cells = (stones << 1) & (stones << 2) & (stones << 3)
+        for shift in (h1, h1 - 1, h1 + 1):
+            pairs = (stones << shift) & (stones << (2 * shift))
+            cells |= pairs & (stones << (3 * shift))
+            cells |= pairs & (stones >> shift)
+            pairs = (stones >> shift) & (stones >> (2 * shift))
+            cells |= pairs & (stones << shift)
+            cells |= pairs & (stones >> (3 * shift))
+        return cells
+
+    # Returns the actions, whose stone would be placed [above] cells below one of the cells
+    def _actionsBelow(self, cells: int, above: int):
+        h1 = self.height + 1
+        return tuple(x for x in range(self.width)
+                     if self.heights[x] + above < self.height and cells & (1 << (x * h1 + self.heights[x] + above)))
+
+    # Returns true if the bitboard contains four connected stones.
+    # Shifts: 1 = vertical, h+1 = horizontal, h+2 / h = both diagonals
+    def _connectsFour(self, bitboard: int):
+        h1 = self.height + 1
+        for shift in (1, h1, h1 + 1, h1 - 1):
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    # Returns the winner (None if no winner yet / draw)
+    def winner(self):
+        return self._winner
+
+    # Returns true if the game is a draw
+    def isDraw(self):
+        return self._winner == None and self.turns == self.width * self.height
+
+    # Returns true if a player has one or if the state is a draw
+    def isTerminal(self):
+        return self._winner != None or self.turns == self.width * self.height
+
+# Board of a BitboardState: has the width and height of a board.Board,
+# everything else is delegated to the Board object of the current position
+class _BoardView:
+    def __init__(self, state):
+        self.state = state
+        self.width = state.width
+        self.height = state.height
+
+    def __getattr__(self, name):
+        return getattr(self.state._fullBoard(), name)
+
+    def __getitem__(self, index: int):
+        return self.state._fullBoard()[index]
+
+    def __str__(self):
+        return str(self.state._fullBoard())
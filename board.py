@@ -23,10 +23,10 @@ class Board:
 
     # Returns a copy of this board object
     def copy(self):
-        copy = Board(self.width, self.height)
-        for x in range(self.width):
-            for y in range(self.height):
-                copy[x][y] = self._array[x][y]
+        copy = Board.__new__(Board)
+        copy.width = self.width
+        copy.height = self.height
+        copy._array = [ column.copy() for column in self._array ]
         return copy
 
     # Returns a flat (1D) array of the board stones
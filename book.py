@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import argparse, mmap, os, struct
+from concurrent.futures import ProcessPoolExecutor
+from state import GameState
+from bitboard import BitboardState
+from algorithms import minimaxABInPlace
+from ordering import MoveOrdering
+from transposition import TranspositionTable
+
+"""
+    Opening book: the best actions of all positions up to a number of plies, precomputed
+    with minimaxABInPlace and stored in a compact binary file.
+
+    File format (little endian):
+        header: magic "C4BK", width, height, plies, depth (1 byte each), number of records (4 bytes)
+        records, sorted by key: position key (8 bytes), score (4 byte float), action (1 byte)
+
+    Positions and their mirror image share one record, stored under the smaller
+    of both keys (see BitboardState.key and mirrorKey), with the action for that orientation.
+    The book is read through mmap, so all bot processes share one page-cached copy.
+"""
+
+_header = struct.Struct("<4sBBBBI")
+_record = struct.Struct("<QfB")
+_magic  = b"C4BK"
+
+# Returns (key, mirrored) of the state, where key is the smaller key of the
+# position and its mirror image, and mirrored is true if that is the mirror image
+def canonicalKey(state):
+    bitboardState = BitboardState.fromGameState(state)
+    key = bitboardState.key()
+    mirrorKey = bitboardState.mirrorKey()
+    return (mirrorKey, True) if mirrorKey < key else (key, False)
+
+class OpeningBook:
+    def __init__(self, filename: str):
+        self.file = open(filename, "rb")
+        self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.plies, self.depth, self.size = _header.unpack_from(self._mmap, 0)
+        if magic != _magic:
+            raise ValueError(f"'{filename}' is not an opening book.")
+
+    # Returns the record (key, score, action) at the given index
+    def _record(self, index: int):
+        return _record.unpack_from(self._mmap, _header.size + index * _record.size)
+
+    # Returns (action, score) for the state, or None if the position is not in the book
+    def lookup(self, state: GameState):
+        if state.board.width != self.width or state.board.height != self.height or state.turns > self.plies:
+            return None
+
+        key, mirrored = canonicalKey(state)
+        low, high = 0, self.size
+        while low < high:
+            mid = (low + high) // 2
+            recordKey, score, action = self._record(mid)
+            if recordKey < key:
+                low = mid + 1
+            elif recordKey > key:
+                high = mid
+            else:
+                return (self.width - 1 - action if mirrored else action, score)
+        return None
+
+    def close(self):
+        self._mmap.close()
+        self.file.close()
+
+# Opened books, by filename, shared by all games of this process
+_books = dict()
+
+# Returns the (cached) opening book for the given filename
+def openBook(filename: str):
+    if filename not in _books:
+        _books[filename] = OpeningBook(filename)
+    return _books[filename]
+
+# Returns all non-terminal positions up to the given number of plies,
+# one per mirror pair, as a list of (key, mirrored, moves)
+def positions(plies: int, width: int=7, height=6):
+    found = dict()
+    layer = [ GameState(width=width, height=height) ]
+    for ply in range(plies + 1):
+        nextLayer = []
+        for state in layer:
+            key, mirrored = canonicalKey(state)
+            if key in found or state.isTerminal():
+                continue
+            found[key] = (key, mirrored, bytes(state.moves))
+            if ply < plies:
+                nextLayer += [ state.generateSuccessor(action) for action in state.getLegalActions() ]
+        layer = nextLayer
+    return list(found.values())
+
+# Searches a single position, returns (key, score, action) with the action
+# for the canonical orientation
+def _searchPosition(args):
+    key, mirrored, moves, width, height, depth = args
+    state = GameState.fromMoves(moves, width=width, height=height)
+    action, value = minimaxABInPlace(True, state, depth, table=TranspositionTable(), ordering=MoveOrdering())
+    return (key, value, width - 1 - action if mirrored else action)
+
+# Builds an opening book and writes it to the given file
+def build(filename: str, plies: int, depth: int, width: int=7, height=6, workers=None):
+    tasks = [ (key, mirrored, moves, width, height, depth) for key, mirrored, moves in positions(plies, width, height) ]
+    print(f"Searching {len(tasks)} positions to a depth of {depth} ...")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        records = sorted(executor.map(_searchPosition, tasks, chunksize=16))
+
+    with open(filename, "wb") as file:
+        file.write(_header.pack(_magic, width, height, plies, depth, len(records)))
+        for record in records:
+            file.write(_record.pack(*record))
+    print(f"Wrote {len(records)} positions to '{filename}' ({os.path.getsize(filename)} bytes).")
+
+"""
+    Builds an opening book, e.g.:
+        python3 book.py --plies 6 --depth 6 --output book.bin
+"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds an opening book for the connect 4 bot.")
+    parser.add_argument("--plies", type=int, default=6, help="number of plies covered by the book")
+    parser.add_argument("--depth", type=int, default=6, help="search depth for every position")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--output", default="book.bin")
+    args = parser.parse_args()
+
+    build(args.output, args.plies, args.depth, args.width, args.height, args.workers)
@@ -0,0 +1,90 @@
+import asyncio, os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from state import GameState
+from game import BotGame
+from parallel import setParallelWorkers
+
+"""
+    Runs the searches of bot games in a pool of worker processes,
+    so that the asyncio event loop of the discord bot is never blocked by a search.
+
+    Positions are sent to the workers as the bytes of their move sequence, and the search
+    records of the workers are added to the records of the games in this process.
+    Every worker keeps the BotGame objects of recent games, so that transposition
+    and move ordering tables are reused for consecutive moves of a game that
+    are handled by the same worker.
+    The cores are shared between the workers: the parallel search (PARALLEL_AB) and the MCTS playouts
+    of every worker only use cpu_count // workers processes.
+"""
+
+# Bot games of this worker process, by game id (least recently used first)
+_workerGames = OrderedDict()
+_maxWorkerGames = 64
+
+# Runs in a worker process: returns the action of the computer for the given position,
+# and the record of its search
+def _search(gameId: str, settings: tuple, width: int, height: int, moves: bytes):
+    game = _workerGames.pop(gameId, None)
+    if game == None or game.settings() != settings:
+        game = BotGame(*settings)
+    _workerGames[gameId] = game
+    while len(_workerGames) > _maxWorkerGames:
+        _workerGames.popitem(last=False)
+
+    game.state = GameState.fromMoves(moves, width=width, height=height)
+    action = game.botAction()
+    return (action, game.records[-1])
+
+# Runs in every worker process when it is started
+def _initWorker(parallelWorkers: int):
+    setParallelWorkers(parallelWorkers)
+
+class BotPool:
+    def __init__(self, workers=None):
+        workers = workers if workers != None else os.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                            initargs=(max(1, os.cpu_count() // workers),))
+
+        # Futures of the running searches, by game id
+        self._searches = dict()
+
+    # Calculates the move of the computer in a worker process and places it.
+    # Returns false if the search has been cancelled.
+    async def botPlace(self, game: BotGame):
+        loop  = asyncio.get_running_loop()
+        state = game.state
+        future = loop.run_in_executor(self.executor, _search, game.gameId, game.settings(),
+                                      state.board.width, state.board.height, bytes(state.moves))
+        self._searches[game.gameId] = future
+        try:
+            action, record = await future
+        except asyncio.CancelledError:
+            # Cancelled by cancel(), which already removed the search
+            if self._searches.get(game.gameId) is not future:
+                return False
+            raise
+        finally:
+            if self._searches.get(game.gameId) is future:
+                del self._searches[game.gameId]
+
+        game.records.append(record)
+        return game.place(action)
+
+    # Cancels the search of the given game (e.g. when it has been abandoned).
+    # A search which has not been started yet is removed from the queue,
+    # the result of a running search is discarded.
+    def cancel(self, game: BotGame):
+        future = self._searches.pop(game.gameId, None)
+        if future != None:
+            future.cancel()
+
+    # Returns true if the computer is currently calculating a move for the given game
+    def isSearching(self, game: BotGame):
+        return game.gameId in self._searches
+
+    # Stops the worker processes
+    def shutdown(self):
+        for future in self._searches.values():
+            future.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,16 @@
 from stones import Stone, Red, Yellow, Empty
 from state import GameState, IllegalActionException
-from algorithms import random, minimax, minimaxAB
+from bitboard import BitboardState
+from algorithms import random, minimaxInPlace, minimaxABInPlace, iterativeDeepening, forcedAction, SearchTimeout
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+from book import openBook
+from solver import Solver
+from mcts import MCTS
+from parallel import parallelSearch, parallelWorkers
+from record import GameRecord
+from searchstats import SearchStats
+import json, uuid
 
 class Game:
     def __init__(self):
@@ -78,11 +88,10 @@ class Game:
         else:
             return None
 
-    # Returns the object as a dictionary
+    # Returns the object as a dictionary, the moves are stored as a compact record (see record.py)
     def toDict(self):
         gameDict = dict()
-        boardString = [ stone for stone in self.state.board.flatten() ]
-        gameDict["board"] = boardString
+        gameDict["record"] = GameRecord.fromGame(self).toString()
         gameDict["redPlayer"] = f"#{self.redPlayer.id}"
         gameDict["yellowPlayer"] = f"#{self.yellowPlayer.id}"
         gameDict["winner"] = "" if self.getWinner() == None else f"#{self.getWinner().id}"
@@ -95,23 +104,158 @@ class Game:
 RANDOM     = "RANDOM"
 MINIMAX    = "MINIMAX"
 MINIMAX_AB = "MINIMAX_AB"
+SOLVER     = "SOLVER"
+MCTS_MODE  = "MCTS"
+PARALLEL_AB = "PARALLEL_AB"
+
+# Game state engines, on which BotGame searches
+GAMESTATE = "GAMESTATE"
+BITBOARD  = "BITBOARD"
+
+# Time budget of the SOLVER mode in seconds, if no timeBudget is given
+SOLVER_BUDGET = 1.0
+# Number of iterations of the MCTS mode, if neither iterations nor a timeBudget are given
+MCTS_ITERATIONS = 1000
 
 class BotGame(Game):
 
-    def __init__(self, mode=RANDOM, depth=4):
+    # If a timeBudget (in seconds) is given, the MINIMAX_AB mode searches as deep as possible
+    # within the budget (iterative deepening), instead of searching to a fixed depth.
+    # If the filename of an opening book is given, positions in the book are not searched
+    # (except in the SOLVER mode, since the book stores the results of depth limited searches).
+    # The SOLVER mode plays perfectly if the position can be solved within the time budget.
+    # Otherwise it falls back to the MINIMAX_AB search, and the move is not necessarily perfect
+    # (the record of the move has the source MINIMAX_AB).
+    # The MCTS mode searches for the given number of iterations and/or the time budget,
+    # with the playouts spread over the available cores (the nodes of its records are playouts).
+    # The PARALLEL_AB mode splits the MINIMAX_AB search over one worker process per core.
+    # Every move is measured with a SearchStats object, optionally with the given profiler.
+    # With the engine BITBOARD, the MINIMAX and MINIMAX_AB searches (and the forced moves)
+    # run on a bitboard.BitboardState copy of the position instead of the GameState.
+    def __init__(self, mode=RANDOM, depth=4, timeBudget=None, book=None, iterations=None, profiler=None,
+                 engine=GAMESTATE):
         super().__init__()
         self.mode = mode
         self.depth = depth
+        self.timeBudget = timeBudget
+        self.book = book
+        self.iterations = iterations
+        self.profiler = profiler
+        self.engine = engine
+
+        # Search records of all moves of the computer (see botAction)
+        self.records = []
+
+        # Unique id of this game, which identifies it in the worker processes of botpool.BotPool
+        self.gameId = uuid.uuid4().hex
+
+        # Transposition table, move ordering tables and solver, which are reused for all moves of this game.
+        # They are created by the first search (see _createTables), so that the games of the main process
+        # don't allocate them if the searches run in the worker processes of botpool.BotPool.
+        self.table = None
+        self.ordering = None
+        self.solver = None
+
+        # Monte Carlo search tree, which is reused for all moves of this game
+        if mode == MCTS_MODE:
+            if iterations == None and timeBudget == None:
+                iterations = MCTS_ITERATIONS
+            # Playouts run in parallel if more than one core is available to this process
+            workers = parallelWorkers()
+            self.mcts = MCTS(iterations=iterations, timeBudget=timeBudget, workers=workers if workers > 1 else 0)
+        else:
+            self.mcts = None
+
+    # Returns the arguments to create a BotGame with the same settings
+    def settings(self):
+        return (self.mode, self.depth, self.timeBudget, self.book, self.iterations, self.profiler, self.engine)
 
     # Represents a move by the computer
     def botPlace(self):
-        #print(f"Calculating move using mode={self.mode} with a depth of {self.depth}.")
+        return super().place(self.botAction())
+
+    # Calculates the action of the computer, and adds a record of the search to self.records
+    def botAction(self):
+        stats = SearchStats(self.profiler)
+        stats.start(self.state)
+        action, source = self._search(stats)
+        stats.stop()
+
+        record = { "turn" : self.state.turns, "mode" : self.mode, "source" : source, "depth" : self.depth, "action" : action }
+        record.update(stats.toDict())
+        self.records.append(record)
+        return action
 
-        if self.mode == MINIMAX:
-            super().place(minimax(True, self.state, self.depth)[0])
+    # Returns (action, source) where source is the mode which has calculated the action
+    # ("BOOK" for opening book moves, "FORCED" for winning moves and the only move which blocks a threat)
+    def _search(self, stats: SearchStats):
+        if self.book != None and self.mode not in (RANDOM, SOLVER):
+            entry = openBook(self.book).lookup(self.state)
+            if entry != None:
+                return (entry[0], "BOOK")
+
+        state = self._searchState()
+        if self.mode != RANDOM:
+            action = forcedAction(state)
+            if action != None:
+                return (action, "FORCED")
+
+        if self.mode in (SOLVER, MINIMAX_AB):
+            self._createTables()
+
+        if self.mode == SOLVER:
+            try:
+                budget = self.timeBudget if self.timeBudget != None else SOLVER_BUDGET
+                self.solver.nodes = 0
+                action = self.solver.bestAction(self.state, budget=budget)[0]
+                stats.nodes = self.solver.nodes
+                return (action, SOLVER)
+            except SearchTimeout:
+                stats.nodes = self.solver.nodes
+                action = minimaxABInPlace(True, state, self.depth, table=self.table, ordering=self.ordering,
+                                          stats=stats)[0]
+                return (action, MINIMAX_AB)
+
+        elif self.mode == MCTS_MODE:
+            action = self.mcts.bestAction(self.state)[0]
+            stats.nodes = self.mcts.playoutCount
+            return (action, MCTS_MODE)
+
+        elif self.mode == PARALLEL_AB:
+            return (parallelSearch().search(True, self.state, self.depth, stats=stats)[0], PARALLEL_AB)
+
+        elif self.mode == MINIMAX:
+            return (minimaxInPlace(True, state, self.depth, stats=stats)[0], MINIMAX)
+
+        elif self.mode == MINIMAX_AB and self.timeBudget != None:
+            action = iterativeDeepening(True, state, self.timeBudget, table=self.table, ordering=self.ordering,
+                                        stats=stats)[0]
+            return (action, MINIMAX_AB)
 
         elif self.mode == MINIMAX_AB:
-            super().place(minimaxAB(True, self.state, self.depth)[0])
+            action = minimaxABInPlace(True, state, self.depth, table=self.table, ordering=self.ordering,
+                                      stats=stats)[0]
+            return (action, MINIMAX_AB)
 
         else:
-            super().place(random(self.state))
+            return (random(self.state), RANDOM)
+
+    # Creates the transposition table, the move ordering tables and the solver, if not done yet
+    def _createTables(self):
+        if self.table == None:
+            self.table = TranspositionTable()
+            self.ordering = MoveOrdering()
+        if self.mode == SOLVER and self.solver == None:
+            self.solver = Solver(self.width(), self.height())
+
+    # Returns the position on which the search engine runs
+    def _searchState(self):
+        if self.engine == BITBOARD:
+            return BitboardState.fromGameState(self.state)
+        return self.state
+
+    # Appends the search records of this game to a JSON lines file
+    def exportRecords(self, filename: str):
+        with open(filename, "a") as file:
+            for record in self.records:
+                file.write(json.dumps(record) + "\n")
@@ -0,0 +1,67 @@
+"""
+    Precomputed tables of the lines and 4-windows of a board, cached per geometry.
+    Cells are indexed by x * height + y, with the coordinates of board.Board.
+    The windows are all possible connections of four, so both the win check of GameState
+    and the evaluation (see algorithms.evaluate) run off these tables, for any board size.
+"""
+
+# Cached geometries, by (width, height)
+_geometries = dict()
+
+# Returns the (cached) geometry for the given board size
+def geometry(width: int, height: int):
+    if (width, height) not in _geometries:
+        _geometries[(width, height)] = Geometry(width, height)
+    return _geometries[(width, height)]
+
+class Geometry:
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        w = width
+        h = height
+
+        # All lines with at least 4 cells: rows, columns and diagonals
+        self.lines = []
+        self.lines += [ tuple(x * h + y for x in range(w)) for y in range(h) ]
+        self.lines += [ tuple(x * h + y for y in range(h)) for x in range(w) ]
+
+        # Diagonals start on the left (LR = left-to-right) or right (RL = right-to-left) edge, or in the first row
+        startsLR = [ (0, y) for y in range(h - 1, 0, -1) ] + [ (x, 0) for x in range(w) ]
+        startsRL = [ (w - 1, y) for y in range(h - 1, 0, -1) ] + [ (x, 0) for x in range(w - 1, -1, -1) ]
+        for (sx, sy) in startsLR:
+            line = tuple((sx + i) * h + (sy + i) for i in range(min(w - sx, h - sy)))
+            if len(line) >= 4:
+                self.lines.append(line)
+        for (sx, sy) in startsRL:
+            line = tuple((sx - i) * h + (sy + i) for i in range(min(sx + 1, h - sy)))
+            if len(line) >= 4:
+                self.lines.append(line)
+
+        # All 4-windows of the lines, and the line of every window
+        self.windows = []
+        self.windowLine = []
+        for i, line in enumerate(self.lines):
+            for start in range(len(line) - 3):
+                self.windows.append(line[start:start + 4])
+                self.windowLine.append(i)
+
+        # Indices of the windows containing each cell
+        self.cellWindows = [ [] for cell in range(w * h) ]
+        for i, window in enumerate(self.windows):
+            for cell in window:
+                self.cellWindows[cell].append(i)
+        self.cellWindows = [ tuple(windows) for windows in self.cellWindows ]
+
+        # Middle bias of every cell: 1 for the center column(s), 0.5 for their neighbours.
+        # Symmetric, so that mirrored positions have the same score.
+        columnWeights = [0] * w
+        mid = w // 2
+        centers = (mid - 1, mid) if w % 2 == 0 else (mid,)
+        for x in centers:
+            columnWeights[x] = 1
+        # Narrow boards have no neighbours on one or both sides
+        for x in (centers[0] - 1, centers[-1] + 1):
+            if 0 <= x < w:
+                columnWeights[x] = 0.5
+        self.centerWeights = [ columnWeights[cell // h] for cell in range(w * h) ]
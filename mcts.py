@@ -0,0 +1,193 @@
+import math, time
+import random as rand
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from stones import Red, Yellow
+from state import GameState
+from bitboard import BitboardState
+
+"""
+    Monte Carlo tree search (UCT).
+    Every iteration selects a leaf of the search tree with the UCB1 formula, expands it by one
+    action, and scores it with a batch of playouts. The tree is kept between the moves of a game.
+    Playouts run on a BitboardState (the faster engine with the GameState interface), either
+    in this process or spread over a pool of worker processes, which is shared by all searches.
+"""
+
+# Playout policies
+RANDOM_PLAYOUT    = "RANDOM"
+HEURISTIC_PLAYOUT = "HEURISTIC"
+
+# Plays random games from the position given by its moves.
+# The HEURISTIC policy wins directly if possible and blocks direct wins of the opponent.
+# Returns a tuple with the number of (yellow wins, red wins, draws).
+def playouts(moves: bytes, width: int, height: int, count: int, policy: str, seed=None):
+    generator = rand.Random(seed)
+    start = BitboardState(width=width, height=height, scored=False)
+    for action in moves:
+        start.place(action)
+
+    results = [0, 0, 0]
+    for i in range(count):
+        state = start.copy()
+        while not state.isTerminal():
+            actions = state.getLegalActions()
+            action = None
+            if policy == HEURISTIC_PLAYOUT:
+                winning = state.winningActions()
+                if not winning:
+                    # Block the winning cells of the opponent
+                    state.nextPlayer()
+                    winning = state.winningActions()
+                    state.nextPlayer()
+                if winning:
+                    action = winning[0]
+            if action == None:
+                action = generator.choice(actions)
+            state.place(action)
+
+        winner = state.winner()
+        results[0 if winner == Yellow else (1 if winner == Red else 2)] += 1
+    return tuple(results)
+
+# Shared process pools for the playouts, by number of workers
+_playoutPools = dict()
+
+# Returns the shared pool with the given number of workers (created on first use)
+def playoutPool(workers: int):
+    if workers not in _playoutPools:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # Stop the workers before this process exits (see parallel.parallelSearch)
+        Finalize(executor, executor.shutdown, exitpriority=20)
+        _playoutPools[workers] = executor
+    return _playoutPools[workers]
+
+class Node:
+    def __init__(self, parent, action, state: GameState):
+        self.parent = parent
+        self.action = action
+        self.children = dict()
+        self.untried = list(state.getLegalActions()) if not state.isTerminal() else []
+        rand.shuffle(self.untried)
+
+        # Statistics from the view of the player who played the action into this node
+        self.player = Red if state.currentPlayer == Yellow else Yellow
+        self.visits = 0
+        self.wins = 0.0
+
+    # Returns the child with the highest UCB1 score
+    def select(self, exploration: float):
+        logVisits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(logVisits / child.visits))
+
+class MCTS:
+    # Searches until the number of iterations or the time budget (in seconds) is reached.
+    # Each iteration scores a leaf with [batchSize] playouts, with [workers] > 0 the
+    # playouts of several leaves run in parallel in a (shared) process pool.
+    def __init__(self, iterations=None, timeBudget=None, exploration=math.sqrt(2),
+                 policy=RANDOM_PLAYOUT, batchSize=8, workers=0):
+        self.iterations = iterations
+        self.timeBudget = timeBudget
+        self.exploration = exploration
+        self.policy = policy
+        self.batchSize = batchSize
+        self.workers = workers
+        self.executor = playoutPool(workers) if workers > 0 else None
+
+        # Search tree, with the moves of the root position
+        self.root = None
+        self.rootMoves = None
+
+        # Number of playouts of the last search
+        self.playoutCount = 0
+
+    # Moves the root of the tree to the given state, keeping the subtree
+    # if the state follows the previous root position
+    def _advance(self, state: GameState):
+        moves = tuple(state.moves)
+        node = self.root
+        if node != None and moves[:len(self.rootMoves)] == self.rootMoves:
+            for action in moves[len(self.rootMoves):]:
+                node = node.children.get(action)
+                if node == None:
+                    break
+        else:
+            node = None
+
+        if node == None:
+            node = Node(None, None, state)
+        node.parent = None
+        self.root = node
+        self.rootMoves = moves
+
+    # Selects and expands a leaf. The path is counted as visited by a whole batch
+    # (virtual loss), so that parallel selections explore different leaves.
+    # Returns the path from the root and the state of the leaf.
+    def _selectLeaf(self, state: GameState):
+        state = state.copy()
+        node = self.root
+        path = [ node ]
+        while not node.untried and node.children:
+            node = node.select(self.exploration)
+            state.play(node.action)
+            path.append(node)
+
+        if node.untried:
+            action = node.untried.pop()
+            state.play(action)
+            child = Node(node, action, state)
+            node.children[action] = child
+            path.append(child)
+
+        for node in path:
+            node.visits += self.batchSize
+        return (path, state)
+
+    # Adds the playout results (yellow wins, red wins, draws) to all nodes of the path
+    def _backpropagate(self, path, results):
+        for node in path:
+            node.wins += (results[0] if node.player == Yellow else results[1]) + 0.5 * results[2]
+
+    # Returns the playout results of a leaf, terminal states are scored directly
+    def _playouts(self, state: GameState, seed: int):
+        if state.isTerminal():
+            winner = state.winner()
+            count = self.batchSize
+            return (count if winner == Yellow else 0, count if winner == Red else 0, count if winner == None else 0)
+        return playouts(bytes(state.moves), state.board.width, state.board.height, self.batchSize, self.policy, seed)
+
+    # Returns (action, win rate) of the most visited action in the given (non terminal) state
+    def bestAction(self, state: GameState):
+        self._advance(state)
+        deadline = time.perf_counter() + self.timeBudget if self.timeBudget != None else None
+        iterations = 0
+        self.playoutCount = 0
+        while True:
+            leaves = [ self._selectLeaf(state) for i in range(max(1, self.workers)) ]
+            seeds = [ rand.getrandbits(32) for leaf in leaves ]
+
+            if self.executor != None:
+                futures = [ None if leafState.isTerminal() else
+                            self.executor.submit(playouts, bytes(leafState.moves), leafState.board.width,
+                                                 leafState.board.height, self.batchSize, self.policy, seed)
+                            for (path, leafState), seed in zip(leaves, seeds) ]
+                results = [ self._playouts(leafState, seed) if future == None else future.result()
+                            for (path, leafState), seed, future in zip(leaves, seeds, futures) ]
+            else:
+                results = [ self._playouts(leafState, seed) for (path, leafState), seed in zip(leaves, seeds) ]
+
+            for (path, leafState), result in zip(leaves, results):
+                self._backpropagate(path, result)
+
+            iterations += len(leaves)
+            self.playoutCount += len(leaves) * self.batchSize
+            if self.iterations != None and iterations >= self.iterations:
+                break
+            if deadline != None and time.perf_counter() > deadline:
+                break
+            if self.iterations == None and deadline == None:
+                break
+
+        best = max(self.root.children.values(), key=lambda child: child.visits)
+        return (best.action, best.wins / best.visits)
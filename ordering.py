@@ -0,0 +1,69 @@
+from stones import Yellow
+
+"""
+    Move ordering for the alpha-beta search.
+    The earlier the best action is searched, the more of the remaining actions are pruned.
+"""
+
+# Cached center-first column orders, by board width
+_centerOrders = dict()
+
+# Returns all columns of the board, sorted by their distance to the center
+def centerOrder(width: int):
+    if width not in _centerOrders:
+        _centerOrders[width] = tuple(sorted(range(width), key=lambda x: abs(2 * x - (width - 1))))
+    return _centerOrders[width]
+
+# Returns the actions sorted center-first, with the action [first] moved to the front
+def centerFirst(state, actions, first=None):
+    ordered = [ action for action in centerOrder(state.board.width) if action in actions ]
+    if first in actions:
+        ordered.remove(first)
+        ordered.insert(0, first)
+    return tuple(ordered)
+
+"""
+    Move ordering with killer moves and the history heuristic.
+    Killer moves are the last actions which caused a cutoff at the same turn number,
+    the history counts cutoffs of each action for each player, weighted by the remaining depth.
+    Both tables are kept across searches, so an instance should be used for a single game.
+"""
+class MoveOrdering:
+    def __init__(self, killerSlots: int=2):
+        self.killerSlots = killerSlots
+        self.killers = dict()
+        self.history = dict()
+
+    # Ages the history of previous searches
+    def newSearch(self):
+        for key in self.history:
+            self.history[key] //= 2
+
+    # Returns the actions in the order they should be searched:
+    # [first] (e.g. from the transposition table), killer moves,
+    # then by history score, ties are broken center-first.
+    def order(self, state, actions, first=None):
+        player = state.currentPlayer == Yellow
+        killers = self.killers.get(state.turns, ())
+        history = self.history
+        center = centerOrder(state.board.width)
+
+        def priority(action):
+            if action == first:
+                return (0, 0, 0)
+            elif action in killers:
+                return (1, killers.index(action), 0)
+            return (2, -history.get((player, action), 0), center.index(action))
+
+        return tuple(sorted(actions, key=priority))
+
+    # Records that [action] caused a cutoff in [state], searched with the remaining [depth]
+    def cutoff(self, state, action: int, depth: int):
+        killers = self.killers.setdefault(state.turns, [])
+        if action in killers:
+            killers.remove(action)
+        killers.insert(0, action)
+        del killers[self.killerSlots:]
+
+        key = (state.currentPlayer == Yellow, action)
+        self.history[key] = self.history.get(key, 0) + depth * depth
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import argparse, os, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from state import GameState
+from algorithms import minimaxABInPlace, threatActions, distinctActions, randomMirror
+from ordering import MoveOrdering, centerFirst
+from transposition import TranspositionTable
+from searchstats import SearchStats
+
+"""
+    Parallel alpha-beta search by splitting the root actions over worker processes.
+    The first action (center-first) is searched locally to get a bound for the remaining
+    actions ("young brothers wait"), which are then searched in parallel with that bound.
+    Every worker keeps its own transposition table and move ordering between searches.
+"""
+
+# Tables of this worker process
+_workerTable = None
+_workerOrdering = None
+
+# Runs in a worker process: returns (action, value, stats) of the root action, whose successor is
+# searched to the given depth with the window (alpha, beta). stats is a SearchStats object
+# of the search if collectStats is true (None otherwise).
+def _searchAction(moves: bytes, width: int, height: int, maximize: bool, action: int, depth: int, alpha: float, beta: float,
+                  collectStats: bool=False):
+    global _workerTable, _workerOrdering
+    if _workerTable == None:
+        _workerTable = TranspositionTable()
+        _workerOrdering = MoveOrdering()
+
+    state = GameState.fromMoves(moves, width=width, height=height)
+    stats = None
+    if collectStats:
+        # The depth of the nodes is counted from the root of the whole search
+        stats = SearchStats()
+        stats.start(state)
+    state.play(action)
+    value = minimaxABInPlace(not maximize, state, depth, alpha, beta, table=_workerTable, ordering=_workerOrdering,
+                             stats=stats)[1]
+    return (action, value, stats)
+
+class ParallelSearch:
+    def __init__(self, workers=None):
+        self.workers = workers if workers != None else os.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    # Calculates an optimal action with the minimax algorithm and alpha-beta pruning,
+    # with the same result interface (action, value) as algorithms.minimaxAB.
+    # If a SearchStats object is given, the counts of all workers are added to it.
+    def search(self, maximize: bool, state: GameState, depth: int, stats: SearchStats=None):
+        if depth == 0 or state.isTerminal():
+            return minimaxABInPlace(maximize, state, depth, stats=stats)
+
+        # Threats and unsafe actions are handled as in algorithms.minimaxABInPlace. Wins, double threats
+        # and forced moves (which are searched one ply deeper) are left to the sequential search.
+        actions, value = threatActions(maximize, state, state.getLegalActions())
+        if value != None or len(actions) == 1:
+            return minimaxABInPlace(maximize, state, depth, stats=stats)
+        actions = centerFirst(state, distinctActions(state, actions))
+        collectStats = stats != None
+        if collectStats:
+            stats.node(state)
+
+        w = state.board.width
+        h = state.board.height
+        moves = bytes(state.moves)
+
+        # Eldest brother: searched first, its value bounds the other actions
+        chosenAction, value, actionStats = _searchAction(moves, w, h, maximize, actions[0], depth - 1,
+                                                         -float("inf"), float("inf"), collectStats)
+        if collectStats:
+            stats.add(actionStats)
+        alpha, beta = (value, float("inf")) if maximize else (-float("inf"), value)
+
+        futures = [ self.executor.submit(_searchAction, moves, w, h, maximize, action, depth - 1, alpha, beta,
+                                          collectStats)
+                    for action in actions[1:] ]
+        for future in futures:
+            action, newValue, actionStats = future.result()
+            if collectStats:
+                stats.add(actionStats)
+            # Only values outside of the bound are exact and better
+            if (maximize and newValue > value) or (not maximize and newValue < value):
+                value = newValue
+                chosenAction = action
+        return (randomMirror(state, chosenAction), value)
+
+    # Stops the worker processes
+    def shutdown(self):
+        self.executor.shutdown()
+
+# Shared parallel search of this process (created on first use), and its number of workers
+_parallelSearch = None
+_parallelWorkers = None
+
+# Sets the number of workers of the shared parallel search and of the MCTS playouts of BotGame
+# (None: one per core). Processes which run several searches at the same time
+# (e.g. the workers of botpool.BotPool) have to share the cores between them.
+def setParallelWorkers(workers):
+    global _parallelWorkers
+    _parallelWorkers = workers
+
+# Returns the number of processes, that a search of this process may use
+def parallelWorkers():
+    return _parallelWorkers if _parallelWorkers != None else os.cpu_count()
+
+# Returns the parallel search of this process
+def parallelSearch():
+    global _parallelSearch
+    if _parallelSearch == None:
+        _parallelSearch = ParallelSearch(parallelWorkers())
+        # A worker process (e.g. of botpool.BotPool) waits for its child processes when it exits,
+        # so the workers of the search have to be stopped before (and before the queues of the
+        # executor are closed, which are finalized with priority 10)
+        Finalize(_parallelSearch, _parallelSearch.shutdown, exitpriority=20)
+    return _parallelSearch
+
+# Positions for the benchmark, given by their moves
+benchmarkPositions = ( (), (3, 3, 2, 4), (3, 2, 3, 3, 4, 4, 2), (3, 3, 3, 3, 2, 4, 4, 2, 1, 5) )
+
+# Measures the speedup of the parallel search over the sequential search
+# for every number of workers up to [maxWorkers]
+def benchmark(depth: int, maxWorkers: int):
+    def measure(search):
+        start = time.perf_counter()
+        for moves in benchmarkPositions:
+            search(GameState.fromMoves(moves))
+        return time.perf_counter() - start
+
+    sequential = measure(lambda state: minimaxABInPlace(True, state, depth, table=TranspositionTable(), ordering=MoveOrdering()))
+    print(f"Depth {depth}, {len(benchmarkPositions)} positions")
+    print(f"sequential: {sequential:.2f}s")
+
+    for workers in range(1, maxWorkers + 1):
+        # A new pool for every measurement, so that no tables are reused
+        parallel = ParallelSearch(workers)
+        elapsed = measure(lambda state: parallel.search(True, state, depth))
+        parallel.shutdown()
+        print(f"{workers} workers: {elapsed:.2f}s (speedup {sequential / elapsed:.2f}x)")
+
+"""
+    Benchmarks the parallel search, e.g.:
+        python3 parallel.py --depth 7 --workers 4
+"""
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the speedup of the parallel alpha-beta search.")
+    parser.add_argument("--depth", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="maximum number of workers")
+    args = parser.parse_args()
+
+    benchmark(args.depth, args.workers)
@@ -0,0 +1,99 @@
+import base64, struct
+from stones import Red, Yellow
+from state import GameState
+
+"""
+    Compact record of a game: the sequence of played columns, packed into 4 bits per move,
+    together with the ids of both players, the result and the size of the board.
+    Records are stored as bytes, or as base64 strings in JSON (see Game.toDict), and can
+    be replayed into a GameState.
+
+    Layout (little endian):
+        version, width, height, result : 1 byte each
+        number of moves                : 2 bytes
+        red player id, yellow player id: 8 bytes each
+        moves                          : 4 bits each, the first move in the high bits
+"""
+
+VERSION = 1
+
+# Results
+ONGOING    = 0
+YELLOW_WIN = 1
+RED_WIN    = 2
+DRAW       = 3
+
+_header = struct.Struct("<BBBBHQQ")
+
+class GameRecord:
+    def __init__(self, moves, width: int=7, height: int=6, result: int=ONGOING, redId: int=0, yellowId: int=0):
+        self.moves = bytes(moves)
+        self.width = width
+        self.height = height
+        self.result = result
+        self.redId = redId
+        self.yellowId = yellowId
+
+    # Creates the record of a game (players without an id are stored as 0)
+    @classmethod
+    def fromGame(cls, game):
+        state = game.state
+        if state.winner() == Yellow:
+            result = YELLOW_WIN
+        elif state.winner() == Red:
+            result = RED_WIN
+        elif state.isDraw():
+            result = DRAW
+        else:
+            result = ONGOING
+        redId = game.redPlayer.id if game.redPlayer != None else 0
+        yellowId = game.yellowPlayer.id if game.yellowPlayer != None else 0
+        return cls(state.moves, state.board.width, state.board.height, result, redId, yellowId)
+
+    # Returns the record of a match dictionary, or None for matches stored without a record
+    @classmethod
+    def fromMatch(cls, match: dict):
+        if "record" not in match:
+            return None
+        return cls.fromString(match["record"])
+
+    def encode(self) -> bytes:
+        if self.width > 16:
+            raise ValueError(f"A width of {self.width} does not fit into a record")
+        moves = self.moves
+        packed = bytes((first << 4) | second for first, second in zip(moves[0::2], moves[1::2]))
+        if len(moves) % 2 == 1:
+            packed += bytes((moves[-1] << 4,))
+        return _header.pack(VERSION, self.width, self.height, self.result, len(moves), self.redId, self.yellowId) + packed
+
+    @classmethod
+    def decode(cls, data: bytes):
+        version, width, height, result, count, redId, yellowId = _header.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unknown record version {version}")
+        moves = bytearray()
+        for byte in data[_header.size:]:
+            moves.append(byte >> 4)
+            moves.append(byte & 15)
+        return cls(moves[:count], width, height, result, redId, yellowId)
+
+    # Returns the record as base64 string (for JSON)
+    def toString(self) -> str:
+        return base64.b64encode(self.encode()).decode("ascii")
+
+    @classmethod
+    def fromString(cls, string: str):
+        return cls.decode(base64.b64decode(string))
+
+    # Returns the state after all moves of the record
+    def replay(self) -> GameState:
+        return GameState.fromMoves(self.moves, width=self.width, height=self.height)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __eq__(self, other):
+        if isinstance(other, GameRecord):
+            return self.encode() == other.encode()
+        else:
+            return False
@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+
+"""
+    Registry of the running games, indexed by the id of their discord message,
+    with secondary indexes by channel and by player.
+    Games without activity for [ttl] seconds are evicted, and the registry holds
+    at most [capacity] games (the least recently active games are evicted first).
+"""
+class GameRegistry:
+    def __init__(self, ttl: float=3600, capacity: int=1000, onEvict=None):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.onEvict = onEvict
+
+        # Games by message id, least recently active first, with the time of their last activity
+        self._games = OrderedDict()
+        self._lastActive = dict()
+
+        # Secondary indexes: sets of message ids by channel id and by player id
+        self._byChannel = dict()
+        self._byPlayer = dict()
+        self._players = dict()
+
+    # Adds a game, which must already have a message
+    def add(self, game):
+        key = game.message.id
+        self._games[key] = game
+        self._lastActive[key] = time.monotonic()
+        self._byChannel.setdefault(game.channel.id, set()).add(key)
+        self._players[key] = set()
+        self._indexPlayers(key, game)
+
+        self.evictIdle()
+        while len(self._games) > self.capacity:
+            self._evict(next(iter(self._games)))
+
+    # Returns the game of the given message id (None if not found)
+    def get(self, messageId: int):
+        self.evictIdle()
+        return self._games.get(messageId)
+
+    # Marks the game as active, and updates the player index (e.g. after a player has joined)
+    def touch(self, game):
+        key = game.message.id
+        if key in self._games:
+            self._games.move_to_end(key)
+            self._lastActive[key] = time.monotonic()
+            self._indexPlayers(key, game)
+
+    # Removes a game, returns false if the game was not registered
+    def remove(self, game):
+        if game.message == None or game.message.id not in self._games:
+            return False
+        key = game.message.id
+        del self._games[key]
+        del self._lastActive[key]
+
+        channel = self._byChannel[game.channel.id]
+        channel.discard(key)
+        if not channel:
+            del self._byChannel[game.channel.id]
+        for playerId in self._players.pop(key):
+            games = self._byPlayer[playerId]
+            games.discard(key)
+            if not games:
+                del self._byPlayer[playerId]
+        return True
+
+    # Returns all games in the given channel
+    def byChannel(self, channelId: int):
+        return [ self._games[key] for key in self._byChannel.get(channelId, ()) ]
+
+    # Returns all games of the given player
+    def byPlayer(self, playerId: int):
+        return [ self._games[key] for key in self._byPlayer.get(playerId, ()) ]
+
+    # Evicts all games without activity for more than ttl seconds
+    def evictIdle(self):
+        deadline = time.monotonic() - self.ttl
+        while self._games:
+            key = next(iter(self._games))
+            if self._lastActive[key] > deadline:
+                break
+            self._evict(key)
+
+    def _evict(self, key: int):
+        game = self._games[key]
+        self.remove(game)
+        if self.onEvict != None:
+            self.onEvict(game)
+
+    def _indexPlayers(self, key: int, game):
+        for player in (game.yellowPlayer, game.redPlayer):
+            if player != None and player.id not in self._players[key]:
+                self._players[key].add(player.id)
+                self._byPlayer.setdefault(player.id, set()).add(key)
+
+    def __len__(self):
+        return len(self._games)
+
+    def __contains__(self, game):
+        return game.message != None and self._games.get(game.message.id) is game
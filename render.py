@@ -0,0 +1,126 @@
+import asyncio, time, weakref
+
+"""
+    Render pipeline for the discord messages of the games.
+    Edits of a game message are queued per game, and pending edits are collapsed into the
+    latest content. Edits are sent within the rate limit of their channel, and the board
+    strings are cached per row, so that only the rows changed by new moves are rendered.
+"""
+
+# Emoji of every stone, followed by the spacing between the columns
+_cells = { "R" : ":red_circle:" + " " * 7, "Y" : ":yellow_circle:" + " " * 7, " " : ":white_circle:" + " " * 7 }
+
+"""
+    Cached string representation of a game's board, with one string per row.
+"""
+class BoardString:
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.rows = [ _cells[" "] * width + "\n" ] * height
+        self.heights = [0] * width
+        self.moves = 0
+
+    # Renders the rows changed by the moves since the last update
+    def update(self, state):
+        moves = state.moves
+        if len(moves) < self.moves:
+            self.__init__(self.width, self.height)
+
+        changedRows = set()
+        for action in moves[self.moves:]:
+            self.heights[action] += 1
+            changedRows.add(self.height - self.heights[action])
+        self.moves = len(moves)
+
+        board = state.board
+        for y in changedRows:
+            self.rows[y] = "".join(_cells[str(board[x][y])] for x in range(self.width)) + "\n"
+
+    def __str__(self):
+        return "".join(self.rows)
+
+"""
+    Token bucket: allows [rate] actions per [per] seconds.
+"""
+class RateLimiter:
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    # Waits until an action is allowed
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+class Renderer:
+    # [rate] message edits per [per] seconds are allowed in every channel
+    def __init__(self, rate: int=5, per: float=5.0):
+        self.rate = rate
+        self.per = per
+        self._limiters = dict()
+
+        # Latest pending (content, clearReactions) and the sending task of every game
+        self._pending = dict()
+        self._tasks = dict()
+        self._reactionTasks = dict()
+
+        # Board strings, by game
+        self._boards = weakref.WeakKeyDictionary()
+
+    # Returns the string representation of the game's board
+    def boardString(self, game):
+        board = self._boards.get(game)
+        if board == None:
+            board = BoardString(game.width(), game.height())
+            self._boards[game] = board
+        board.update(game.state)
+        return str(board)
+
+    # Adds the reactions to the message in the background, in the given order
+    def addReactions(self, message, emojis):
+        async def add():
+            for emoji in emojis:
+                await message.add_reaction(emoji)
+        task = asyncio.create_task(add())
+        task.add_done_callback(lambda task: self._reactionTasks.pop(message.id, None))
+        self._reactionTasks[message.id] = task
+
+    # Queues an edit of the game message. If the message has not been updated yet
+    # with a previous edit, only the latest content is sent.
+    def edit(self, game, content: str, clearReactions=False):
+        key = id(game)
+        if key in self._pending:
+            clearReactions = clearReactions or self._pending[key][1]
+        self._pending[key] = (content, clearReactions)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._send(game))
+
+    # Sends the pending edits of the game until none are left
+    async def _send(self, game):
+        key = id(game)
+        try:
+            while key in self._pending:
+                await self._limiter(game.channel.id).acquire()
+                content, clearReactions = self._pending.pop(key)
+                await game.message.edit(content=content)
+                if clearReactions:
+                    reactionTask = self._reactionTasks.pop(game.message.id, None)
+                    if reactionTask != None:
+                        reactionTask.cancel()
+                    await game.message.clear_reactions()
+        finally:
+            del self._tasks[key]
+
+    def _limiter(self, channelId: int):
+        if channelId not in self._limiters:
+            self._limiters[channelId] = RateLimiter(self.rate, self.per)
+        return self._limiters[channelId]
@@ -0,0 +1,105 @@
+import cProfile, io, pstats, time, tracemalloc
+
+"""
+    Statistics of a search, collected by passing a SearchStats object to the search functions
+    (see algorithms.py). Searches without a SearchStats object are not slowed down.
+
+    The collector counts the visited nodes, the leaf evaluations, the beta cutoffs by the index of
+    the cutoff action in the search order, the transposition table probes and hits, and the maximum
+    depth (in plies from the root). The elapsed time is measured between start() and stop().
+    Optionally, the search is run under cProfile or tracemalloc.
+"""
+
+# Profilers
+CPROFILE    = "cprofile"
+TRACEMALLOC = "tracemalloc"
+
+class SearchStats:
+    # [profiler] is None, CPROFILE or TRACEMALLOC
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = []
+        self.tableProbes = 0
+        self.tableHits = 0
+        self.maxDepth = 0
+        self.elapsed = 0.0
+
+        # Summary of the profiler: the top functions (cProfile) or the peak memory in bytes (tracemalloc)
+        self.profile = None
+
+        self._rootTurns = 0
+        self._start = None
+        self._profile = None
+
+    # Starts measuring a search from the given root state
+    def start(self, state):
+        self._rootTurns = state.turns
+        if self.profiler == CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.profiler == TRACEMALLOC:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    # Stops measuring, the elapsed times of several searches are added
+    def stop(self):
+        self.elapsed += time.perf_counter() - self._start
+        if self.profiler == CPROFILE:
+            self._profile.disable()
+            output = io.StringIO()
+            pstats.Stats(self._profile, stream=output).sort_stats("cumulative").print_stats(15)
+            self.profile = output.getvalue()
+            self._profile = None
+        elif self.profiler == TRACEMALLOC:
+            self.profile = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    # Counts a visited node
+    def node(self, state):
+        self.nodes += 1
+        depth = state.turns - self._rootTurns
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+
+    # Counts a beta cutoff by the action at [index] of the search order
+    def cutoff(self, index: int):
+        while len(self.cutoffs) <= index:
+            self.cutoffs.append(0)
+        self.cutoffs[index] += 1
+
+    # Counts a transposition table probe
+    def probe(self, hit: bool):
+        self.tableProbes += 1
+        if hit:
+            self.tableHits += 1
+
+    # Adds the counts of another SearchStats object, e.g. of a part of the search
+    # which has run in another process (see parallel.py)
+    def add(self, other):
+        self.nodes += other.nodes
+        self.leaves += other.leaves
+        while len(self.cutoffs) < len(other.cutoffs):
+            self.cutoffs.append(0)
+        for index, count in enumerate(other.cutoffs):
+            self.cutoffs[index] += count
+        self.tableProbes += other.tableProbes
+        self.tableHits += other.tableHits
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+
+    # Returns the searched nodes per second
+    def nodesPerSecond(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def toDict(self):
+        return {
+            "nodes"       : self.nodes,
+            "leaves"      : self.leaves,
+            "cutoffs"     : list(self.cutoffs),
+            "tableProbes" : self.tableProbes,
+            "tableHits"   : self.tableHits,
+            "maxDepth"    : self.maxDepth,
+            "elapsed"     : self.elapsed,
+            "profile"     : self.profile,
+        }
@@ -0,0 +1,210 @@
+import time
+from stones import Yellow
+from bitboard import BitboardState
+from transposition import TranspositionTable, UPPER
+from ordering import centerOrder
+from algorithms import SearchTimeout
+
+"""
+    Perfect play solver. Computes the exact game-theoretic value of a position with
+    negamax and alpha-beta pruning, narrowed down by null window searches (MTD style).
+
+    Positions are represented like in bitboard.BitboardState, as the bitboard of the
+    player to move (position) and the bitboard of all stones (mask). The search also keeps
+    the bitboards of the mirrored (left-right) position, so that a position and its mirror
+    image share one transposition table entry, and symmetric positions only search one half.
+
+    Scores are seen from the player to move:
+        0 for a draw,
+        a positive score if the player to move wins: the sooner, the higher,
+        (number of cells + 1 - number of stones when the win is completed) // 2,
+        a negative score if the player to move loses (the sooner, the lower).
+"""
+class Solver:
+    def __init__(self, width: int=7, height=6, table=None):
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.table = table if table != None else TranspositionTable(megabytes=64)
+
+        # Number of searched nodes since the last call to solve()
+        self.nodes = 0
+        self._deadline = None
+
+        h1 = height + 1
+        self._h1 = h1
+        self._bottomMask = sum(1 << (x * h1) for x in range(width))
+        self._boardMask = self._bottomMask * ((1 << height) - 1)
+        self._columnMasks = [ ((1 << height) - 1) << (x * h1) for x in range(width) ]
+        self._topMasks = [ 1 << (height - 1 + x * h1) for x in range(width) ]
+        self._order = centerOrder(width)
+
+    # Returns a bitmap of the empty cells that would complete four stones of [position]
+    def _winningCells(self, position: int, mask: int):
+        h1 = self._h1
+        # Vertical
+        cells = (position << 1) & (position << 2) & (position << 3)
+        # Horizontal and both diagonals
+        for shift in (h1, h1 - 1, h1 + 1):
+            pairs = (position << shift) & (position << (2 * shift))
+            cells |= pairs & (position << (3 * shift))
+            cells |= pairs & (position >> shift)
+            pairs = (position >> shift) & (position >> (2 * shift))
+            cells |= pairs & (position << shift)
+            cells |= pairs & (position >> (3 * shift))
+        return cells & (self._boardMask ^ mask)
+
+    # Returns a bitmap of the cells, where the next stone can be placed
+    def _possible(self, mask: int):
+        return (mask + self._bottomMask) & self._boardMask
+
+    # Returns true if the player to move can win with the next stone
+    def _canWinNext(self, position: int, mask: int):
+        return self._winningCells(position, mask) & self._possible(mask) != 0
+
+    # Returns a bitmap of the possible moves, which do not let the opponent win
+    # directly afterwards: moves must block a winning cell of the opponent, and must not
+    # be played directly below one (threat based pruning).
+    def _nonLosingMoves(self, position: int, mask: int):
+        possible = self._possible(mask)
+        opponentWins = self._winningCells(position ^ mask, mask)
+        forced = possible & opponentWins
+        if forced:
+            # The opponent has two winning cells, only one of them can be blocked
+            if forced & (forced - 1):
+                return 0
+            possible = forced
+        return possible & ~(opponentWins >> 1)
+
+    # Returns the mirror image (left-right) of a bitboard
+    def _mirror(self, bitboard: int):
+        h1 = self._h1
+        columnMask = (1 << h1) - 1
+        mirrored = 0
+        for x in range(self.width):
+            mirrored |= ((bitboard >> (x * h1)) & columnMask) << ((self.width - 1 - x) * h1)
+        return mirrored
+
+    # Returns the exact score of the position with the null window search.
+    # [mirrorPosition] and [mirrorMask] are the bitboards of the mirrored position.
+    def _negamax(self, position: int, mask: int, mirrorPosition: int, mirrorMask: int, moves: int, alpha: int, beta: int):
+        self.nodes += 1
+        if self._deadline != None and self.nodes % 1024 == 0 and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        candidates = self._nonLosingMoves(position, mask)
+        if candidates == 0:
+            return -((self.cells - moves) // 2)
+
+        # Draw, if the board is full after the next two moves
+        if moves >= self.cells - 2:
+            return 0
+
+        # The opponent cannot win with the next stone
+        lowest = -((self.cells - 2 - moves) // 2)
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+
+        # We cannot win with the next stone
+        highest = (self.cells - 1 - moves) // 2
+        key = position + mask
+        mirrorKey = mirrorPosition + mirrorMask
+        symmetric = key == mirrorKey
+        if mirrorKey < key:
+            key = mirrorKey
+        entry = self.table.lookup(key)
+        if entry != None:
+            highest = entry[2]
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+
+        # Search moves that create more winning cells first, ties are broken center-first.
+        # Symmetric positions only search the moves of the left half (and the center).
+        h1 = self._h1
+        ordered = []
+        for x in self._order:
+            if symmetric and 2 * x > self.width - 1:
+                continue
+            move = candidates & self._columnMasks[x]
+            if move:
+                mirrorMove = (move >> (x * h1)) << ((self.width - 1 - x) * h1)
+                ordered.append((-bin(self._winningCells(position | move, mask)).count("1"), len(ordered), move, mirrorMove))
+        ordered.sort()
+
+        for _, _, move, mirrorMove in ordered:
+            score = -self._negamax(position ^ mask, mask | move, mirrorPosition ^ mirrorMask, mirrorMask | mirrorMove,
+                                   moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        # Store the upper bound, the number of empty cells decides about the replacement
+        self.table.store(key, self.cells - moves, alpha, UPPER, None)
+        return alpha
+
+    # Returns the exact score of the (non terminal) position.
+    # Raises a SearchTimeout if the deadline (time.perf_counter() value) has passed.
+    def solve(self, position: int, mask: int, moves: int, deadline=None):
+        self.nodes = 0
+        self._deadline = deadline
+        if self._canWinNext(position, mask):
+            return (self.cells + 1 - moves) // 2
+
+        low = -((self.cells - moves) // 2)
+        high = (self.cells + 1 - moves) // 2
+        mirrorPosition = self._mirror(position)
+        mirrorMask = self._mirror(mask)
+        while low < high:
+            # Null window searches, closer to 0 first
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and int(high / 2) > med:
+                med = int(high / 2)
+            score = self._negamax(position, mask, mirrorPosition, mirrorMask, moves, med, med + 1)
+            if score <= med:
+                high = score
+            else:
+                low = score
+        return low
+
+    # Returns (position, mask, moves) of the given state
+    def encode(self, state):
+        bitboardState = BitboardState.fromGameState(state)
+        position = bitboardState.yellow if state.currentPlayer == Yellow else bitboardState.red
+        return (position, bitboardState.yellow | bitboardState.red, state.turns)
+
+    # Returns (action, score) of the perfect move in the given (non terminal) state:
+    # the fastest win, or the slowest loss. Raises a SearchTimeout after the given time budget.
+    def bestAction(self, state, budget=None):
+        deadline = time.perf_counter() + budget if budget != None else None
+        position, mask, moves = self.encode(state)
+        possible = self._possible(mask)
+        playable = [ x for x in self._order if possible & self._columnMasks[x] ]
+
+        # Win directly if possible
+        winning = self._winningCells(position, mask) & possible
+        for x in playable:
+            if winning & self._columnMasks[x]:
+                return (x, (self.cells + 1 - moves) // 2)
+
+        score = self.solve(position, mask, moves, deadline)
+        for x in playable:
+            move = possible & self._columnMasks[x]
+            childPosition, childMask = position ^ mask, mask | move
+            if self._canWinNext(childPosition, childMask):
+                value = -((self.cells - moves) // 2)
+            else:
+                # Null window search: is this move at least as good as the score?
+                value = -self._negamax(childPosition, childMask, self._mirror(childPosition), self._mirror(childMask),
+                                       moves + 1, -score, -score + 1)
+            if value >= score:
+                return (x, score)
+
+        # Not reachable for a correct score
+        return (playable[0], score)
@@ -1,19 +1,77 @@
 from stones import Stone, Red, Yellow, Empty
 from board import Board
+from geometry import geometry
+import random
 
 class IllegalActionException(Exception):
     pass
 
+# Random keys for zobrist hashing, one per player and cell, cached per board geometry
+_zobristKeys = dict()
+
+# Returns the zobrist keys for the given geometry as a tuple (yellowKeys, redKeys, sideKey).
+# The key of the cell (x, y) is at index x * height + y.
+def zobristKeys(width: int, height: int):
+    if (width, height) not in _zobristKeys:
+        generator = random.Random(f"zobrist-{width}x{height}")
+        yellowKeys = [ generator.getrandbits(64) for i in range(width * height) ]
+        redKeys    = [ generator.getrandbits(64) for i in range(width * height) ]
+        _zobristKeys[(width, height)] = (yellowKeys, redKeys, generator.getrandbits(64))
+    return _zobristKeys[(width, height)]
+
+# Score of a 4-window by its number of (yellow, red) stones, from the view of Yellow
+# (the same scores as algorithms.evaluateBlock), at index yellow * 5 + red
+_windowScores = [ 5 if (yellow, red) == (3, 0) else (-5 if (yellow, red) == (0, 3) else 0)
+                  for yellow in range(5) for red in range(5) ]
+
 class GameState:
     def __init__(self, width: int=7, height=6):
         self.board = Board(width, height)
         self.currentPlayer = Yellow
         self.turns = 0
 
-        # Is set by the winner() function, and used for subsequent winner() calls
-        # Should only be used after a called to winner()
+        # Is set by the place() function, when the placed stone connects four
         self._winner = None
 
+        # Coordinates (x, y) of the last placed stone
+        self.lastMove = None
+
+        # Stack of all played actions, used by undo()
+        self.moves = []
+
+        # Number of moves after which the winner was decided (used by undo())
+        self._winnerMoves = 0
+
+        # Zobrist hash of the position (stones and player to move), and the hash of its
+        # mirror image (left-right), updated by play() and undo().
+        # Both are equal if the position is symmetric.
+        self.hash = 0
+        self.mirrorHash = 0
+        self._zobrist = zobristKeys(width, height)
+
+        # Heuristic score of algorithms.evaluate from the view of Yellow, updated by play() and undo().
+        # Based on the number of stones of each player in every 4-window, and the (unclamped)
+        # sum of the window scores of every line.
+        self._geometry = geometry(width, height)
+        self.score = 0
+        self._yellowCounts = [0] * len(self._geometry.windows)
+        self._redCounts = [0] * len(self._geometry.windows)
+        self._lineScores = [0] * len(self._geometry.lines)
+
+        # Threats: the number of windows with 3 stones of a player (and no opponent stone)
+        # that are completed by each empty cell, and the number of empty cells of each column
+        self._yellowThreats = [0] * (width * height)
+        self._redThreats = [0] * (width * height)
+        self._free = [height] * width
+
+    # Creates a state by placing the given actions, starting with an empty board
+    @classmethod
+    def fromMoves(cls, moves, width: int=7, height=6):
+        state = cls(width=width, height=height)
+        for action in moves:
+            state.place(action)
+        return state
+
     # Returns true if the action is legal
     def isLegalAction(self, action: int):
         outsideBounds = action < 0 or action >= self.board.width
@@ -29,15 +87,36 @@ class GameState:
 
         return tuple(actions)
 
+    # Returns a copy of this state
+    def copy(self):
+        copy = GameState.__new__(GameState)
+        copy.board = self.board.copy()
+        copy.currentPlayer = self.currentPlayer
+        copy.turns = self.turns
+        copy._winner = self._winner
+        copy.lastMove = self.lastMove
+        copy.moves = self.moves.copy()
+        copy._winnerMoves = self._winnerMoves
+        copy.hash = self.hash
+        copy.mirrorHash = self.mirrorHash
+        copy._zobrist = self._zobrist
+        copy._geometry = self._geometry
+        copy.score = self.score
+        copy._yellowCounts = self._yellowCounts.copy()
+        copy._redCounts = self._redCounts.copy()
+        copy._lineScores = self._lineScores.copy()
+        copy._yellowThreats = self._yellowThreats.copy()
+        copy._redThreats = self._redThreats.copy()
+        copy._free = self._free.copy()
+        return copy
+
     # Returns the successor based on the action and current player
     def generateSuccessor(self, action: int):
         if not self.isLegalAction(action):
             raise IllegalActionException()
 
-        successor = GameState(width=self.board.width, height=self.board.height)
-        successor.board = self.board.copy()
-        successor.currentPlayer = self.currentPlayer
-        successor.place(action)
+        successor = self.copy()
+        successor.play(action)
         return successor
 
     # Returns the number of stones on the board
@@ -53,95 +132,158 @@ class GameState:
         if not self.isLegalAction(action):
             raise IllegalActionException()
 
+        self.play(action)
+
+    # Places a stone of the current player on the board, without checking
+    # if the action is legal. Can be reverted with undo().
+    def play(self, action: int):
         column = self.board.column(action)
         for i in range(self.board.height - 1, -1, -1):
             if column[i] == Empty:
                 column[i] = self.currentPlayer
+                self.hash ^= self._zobristKey(action, i)
+                self.mirrorHash ^= self._zobristKey(self.board.width - 1 - action, i)
+                self._free[action] = i
+                connectsFour = self._updateScore(action * self.board.height + i, 1)
+                self.lastMove = (action, i)
+                self.moves.append(action)
+                # A win can only be caused by the stone that was just placed
+                if self._winner == None and connectsFour:
+                    self._winner = self.currentPlayer
+                    self._winnerMoves = len(self.moves)
                 self.turns += 1
                 self.nextPlayer()
                 return
 
+    # Reverts the last action placed with play() or place()
+    def undo(self):
+        action = self.moves.pop()
+        column = self.board.column(action)
+        for i in range(self.board.height):
+            if column[i] != Empty:
+                column[i] = Empty
+                break
+
+        if self._winner != None and len(self.moves) < self._winnerMoves:
+            self._winner = None
+        self.turns -= 1
+        self.nextPlayer()
+        self.hash ^= self._zobristKey(action, i)
+        self.mirrorHash ^= self._zobristKey(self.board.width - 1 - action, i)
+        self._free[action] = i + 1
+        self._updateScore(action * self.board.height + i, -1)
+
+        # Restore the coordinates of the previous move
+        if self.moves:
+            previous = self.moves[-1]
+            self.lastMove = (previous, self.board.column(previous).count(Empty))
+        else:
+            self.lastMove = None
+
+    # Returns (hash, mirrored): the smaller hash of the position and its mirror image,
+    # and true if that is the hash of the mirror image
+    def canonicalHash(self):
+        if self.mirrorHash < self.hash:
+            return (self.mirrorHash, True)
+        return (self.hash, False)
+
+    # Returns true if the position is its own mirror image
+    def isSymmetric(self):
+        return self.hash == self.mirrorHash
+
+    # Returns the empty cells (x, y) which would complete four stones of the player
+    def winningCells(self, player: Stone):
+        threats = self._yellowThreats if player == Yellow else self._redThreats
+        h = self.board.height
+        return [ (cell // h, cell % h) for cell, count in enumerate(threats) if count > 0 ]
+
+    # Returns the actions with which the current player wins immediately
+    def winningActions(self):
+        return self._threatActions(self._yellowThreats if self.currentPlayer == Yellow else self._redThreats, 0)
+
+    # Returns the actions with which the opponent would win immediately, if it was their turn.
+    # The current player has to block these actions (and loses if there is more than one).
+    def threatActions(self):
+        return self._threatActions(self._redThreats if self.currentPlayer == Yellow else self._yellowThreats, 0)
+
+    # Returns the actions which would allow the opponent to win directly above them
+    def unsafeActions(self):
+        return self._threatActions(self._redThreats if self.currentPlayer == Yellow else self._yellowThreats, 1)
+
+    # Returns the actions, whose stone would be placed [above] cells below a winning cell of the threats
+    def _threatActions(self, threats, above: int):
+        h = self.board.height
+        return tuple(x for x, free in enumerate(self._free) if free > above and threats[x * h + free - 1 - above] > 0)
+
+    # Returns the cell of the window that is empty in the state with three stones of a player,
+    # (the window contains a second empty cell [other] after a stone has been removed)
+    def _emptyCell(self, window: int, other: int):
+        h = self.board.height
+        board = self.board
+        for cell in self._geometry.windows[window]:
+            if cell != other and board[cell // h][cell % h] == Empty:
+                return cell
+
+    # Returns the zobrist key for a stone of the current player at (x, y),
+    # combined with the key for switching the player to move
+    def _zobristKey(self, x: int, y: int):
+        yellowKeys, redKeys, sideKey = self._zobrist
+        keys = yellowKeys if self.currentPlayer == Yellow else redKeys
+        return keys[x * self.board.height + y] ^ sideKey
+
+    # Adds (delta = 1) or removes (delta = -1) a stone of the current player at the given cell
+    # to the window counts, and updates the score of the windows and lines through this cell.
+    # Returns true if an added stone completes a window of four.
+    def _updateScore(self, cell: int, delta: int):
+        geo = self._geometry
+        yellowCounts = self._yellowCounts
+        redCounts = self._redCounts
+        lineScores = self._lineScores
+        isYellow = self.currentPlayer == Yellow
+        score = self.score
+        connectsFour = False
+
+        for window in geo.cellWindows[cell]:
+            yellow = yellowCounts[window]
+            red = redCounts[window]
+            old = _windowScores[yellow * 5 + red]
+            if isYellow:
+                yellow += delta
+                yellowCounts[window] = yellow
+                connectsFour = connectsFour or yellow == 4
+            else:
+                red += delta
+                redCounts[window] = red
+                connectsFour = connectsFour or red == 4
+            new = _windowScores[yellow * 5 + red]
+
+            if new != old:
+                # The window starts or stops being a threat (three stones of a player)
+                if old != 0:
+                    threats = self._yellowThreats if old > 0 else self._redThreats
+                    threats[cell if delta > 0 else self._emptyCell(window, cell)] -= 1
+                if new != 0:
+                    threats = self._yellowThreats if new > 0 else self._redThreats
+                    threats[self._emptyCell(window, -1)] += 1
+
+                line = geo.windowLine[window]
+                oldLine = lineScores[line]
+                newLine = oldLine + new - old
+                lineScores[line] = newLine
+                # Every line adds a score between -5 and 5
+                score += max(-5, min(5, newLine)) - max(-5, min(5, oldLine))
+
+        center = geo.centerWeights[cell] * delta
+        self.score = score + center if isYellow else score - center
+        return connectsFour
+
     # Returns the winner (None if no winner yet / draw)
     def winner(self):
-        if self._winner != None:
-            return self._winner
-
-        # Check for vertical wins
-        for x in range(self.board.width):
-            score = 0
-            last_stone = None
-            for y in range(self.board.height):
-                stone = self.board[x][y]
-                if stone != last_stone:
-                    score = 1
-                    last_stone = stone
-                elif stone != Empty:
-                    score += 1
-                    if score >= 4:
-                        self._winner = stone
-                        return stone
-
-        # Check for horizontal wins
-        for y in range(self.board.height):
-            score = 0
-            last_stone = None
-            for x in range(self.board.width):
-                stone = self.board[x][y]
-                if stone != last_stone:
-                    score = 1
-                    last_stone = stone
-                elif stone != Empty:
-                    score += 1
-                    if score >= 4:
-                        self._winner = stone
-                        return stone
-
-        # Check for diagonal wins (two different diagonal possibilities)
-        # (1,1,0) -> (delta_x, delta_y, startx when iterating y)
-        for direction in ((1, 1,0), (-1,1,self.board.width-1)):
-            for startx in range(self.board.width):
-                y = 0
-                x = startx
-                score = 0
-                last_stone = None
-                while x >= 0 and x < self.board.width and y >= 0 and y < self.board.height:
-                    stone = self.board[x][y]
-                    if stone != last_stone:
-                        score = 1
-                        last_stone = stone
-                    elif stone != Empty:
-                        score += 1
-                        if score >= 4:
-                            self._winner = stone
-                            return stone
-
-                    x += direction[0]
-                    y += direction[1]
-
-            for starty in range(self.board.height):
-                y = starty
-                x = direction[2]
-                score = 0
-                last_stone = None
-                while x >= 0 and x < self.board.width and y >= 0 and y < self.board.height:
-                    stone = self.board[x][y]
-                    if stone != last_stone:
-                        score = 1
-                        last_stone = stone
-                    elif stone != Empty:
-                        score += 1
-                        if score >= 4:
-                            self._winner = stone
-                            return stone
-
-                    x += direction[0]
-                    y += direction[1]
-
-        return None
+        return self._winner
 
     # Returns true if the game is a draw
     def isDraw(self):
-        return self.winner != None and self.turns == self.board.width * self.board.height
+        return self.winner() == None and self.turns == self.board.width * self.board.height
 
     # Returns true if a player has one or if the state is a draw
     def isTerminal(self):
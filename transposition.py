@@ -0,0 +1,51 @@
+"""
+    Transposition table for the alpha-beta search.
+    Stores the results of already searched positions, keyed by the zobrist hash
+    of the GameState, so that positions reached by different move orders
+    are only searched once.
+"""
+
+# Bound types of a stored value
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Approximate memory used by a single entry (tuple, integer key and float value)
+_ENTRY_BYTES = 160
+
+class TranspositionTable:
+    def __init__(self, megabytes: float=16):
+        self.size = max(1, int(megabytes * 2**20 / _ENTRY_BYTES))
+        self._entries = [None] * self.size
+
+        # Number of the current search, used by the replacement policy
+        self.generation = 0
+
+    # Marks the start of a new search. Entries of older searches are always replaced.
+    def newSearch(self):
+        self.generation += 1
+
+    # Returns the entry (key, depth, value, bound, action, generation) for the key,
+    # or None if the position is not stored
+    def lookup(self, key: int):
+        entry = self._entries[key % self.size]
+        if entry != None and entry[0] == key:
+            return entry
+        return None
+
+    # Stores the result of a search.
+    # Replacement policy: a slot is overwritten if it is empty, holds the same position,
+    # holds an entry of an older search, or holds an entry that was searched less deep.
+    def store(self, key: int, depth: int, value: float, bound: int, action: int):
+        index = key % self.size
+        entry = self._entries[index]
+        if entry == None or entry[0] == key or entry[5] != self.generation or entry[1] <= depth:
+            self._entries[index] = (key, depth, value, bound, action, self.generation)
+
+    # Removes all entries
+    def clear(self):
+        self._entries = [None] * self.size
+
+    # Returns the number of stored entries
+    def __len__(self):
+        return self.size - self._entries.count(None)